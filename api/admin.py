@@ -2,8 +2,17 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
 from .models import User, Card, FollowRelationship, CardStyleDeclaration
+from .styles import batched_style_changes
+
+
+class CardStyleDeclarationAdmin(admin.ModelAdmin):
+    def delete_queryset(self, request, queryset):
+        # one sync for every card touched, not one per deleted row
+        with batched_style_changes():
+            super().delete_queryset(request, queryset)
+
 
 admin.site.register(User, UserAdmin)
 admin.site.register(Card)
 admin.site.register(FollowRelationship)
-admin.site.register(CardStyleDeclaration)
+admin.site.register(CardStyleDeclaration, CardStyleDeclarationAdmin)
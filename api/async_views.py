@@ -0,0 +1,253 @@
+"""
+Async entry points for the hot read endpoints, routed in front of the
+regular views when ASYNC_READ_VIEWS is on (see api/urls.py) for serving
+under ASGI.
+
+These are mostly thread-offloaded sync views, not async ORM ones. Token
+authentication, the response cache, card detail validators and the
+serializer path's card detail read use the async ORM and cache API, so
+cache hits and 304s for a card never leave the event loop. The page
+queries and serialization (DRF's paginators, list validators, card_rows,
+serialize_cards and serializers) are synchronous code shared with the
+regular views and run through sync_to_async on a worker thread, the same
+hand-off Django's async ORM methods make per query.
+
+Every other method, and the GETs these views don't cover (card searches,
+cursor pagination of the card list, requests that negotiate a renderer
+other than JSON such as the browsable API or ?format=api, authentication
+failures, 404s), is passed to the regular DRF view so responses stay
+identical. Querysets, paginators and serializers come from the DRF views
+themselves.
+"""
+
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import NotAcceptable, NotFound
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .authentication import aauthenticate
+from .caching import (
+    acached_entry,
+    adetail_cache_key,
+    alist_cache_key,
+    astore_response,
+    caches_responses_for,
+    hit_headers,
+)
+from .conditional import (
+    acard_validators,
+    is_conditional,
+    not_modified,
+    page_meta,
+    validator_headers,
+)
+from .fastpath import FastCardReadMixin, card_rows, fast_card_reads, serialize_cards
+from .renderers import FastJSONRenderer
+from .views import CardViewSet, FeedView, FollowersListView
+
+# query parameters handled by the regular views rather than here
+SPARSE_FIELD_PARAMS = ("fields", "omit")
+CARD_LIST_SYNC_PARAMS = (
+    "search",
+    "cursor",
+    "pagination",
+) + SPARSE_FIELD_PARAMS
+
+
+class JSONResponse(HttpResponse):
+    """A response rendered like DRF's JSON responses, keeping `data` for the cache."""
+
+    def __init__(self, data, headers=None):
+        super().__init__(
+            FastJSONRenderer().render(data),
+            content_type="application/json",
+            headers={"Vary": "Accept", **(headers or {})},
+        )
+        self.data = data
+
+
+def async_read_view(sync_view, handles=lambda request: True):
+    """
+    Build a view that answers GET with the decorated coroutine and passes
+    anything else to `sync_view`. The coroutine gets an authenticated DRF
+    request and may return None to defer to `sync_view` as well.
+    """
+
+    def decorator(get):
+        async def view(request, *args, **kwargs):
+            if request.method == "GET" and handles(request):
+                drf_request = Request(request, authenticators=())
+                user = None
+                if renders_json(drf_request):
+                    user = await aauthenticate(request)
+                if user is not None:
+                    drf_request.user = user
+                    response = await get(drf_request, *args, **kwargs)
+                    if response is not None:
+                        return response
+            return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+        view.__name__ = view.__qualname__ = get.__name__
+        return csrf_exempt(view)
+
+    return decorator
+
+
+def renders_json(request):
+    """
+    Whether DRF's content negotiation picks the JSON renderer for `request`,
+    as it would in the regular views (Accept header and ?format=).
+    """
+    renderers = [renderer() for renderer in api_settings.DEFAULT_RENDERER_CLASSES]
+    try:
+        renderer, media_type = DefaultContentNegotiation().select_renderer(
+            request, renderers
+        )
+    except NotAcceptable:
+        return False
+    return isinstance(renderer, FastJSONRenderer)
+
+
+def sync_view_instance(view_class, request, action=None, **kwargs):
+    """Set up an instance of a DRF view to borrow its queryset, paginator and serializer."""
+    return view_class(
+        request=request, args=(), kwargs=kwargs, format_kwarg=None, action=action
+    )
+
+
+async def paginated_response(view):
+    queryset = view.filter_queryset(view.get_queryset())
+    try:
+        if isinstance(view, FastCardReadMixin) and fast_card_reads():
+            response = await sync_to_async(view.card_list_response)(queryset)
+            return JSONResponse(response.data)
+        page = await sync_to_async(view.paginate_queryset)(queryset)
+    except NotFound:
+        return None
+    # serializers may still load relations lazily, so not on the event loop
+    data = await sync_to_async(serializer_data)(view, page, many=True)
+    return JSONResponse(view.get_paginated_response(data).data)
+
+
+def serializer_data(view, *args, **kwargs):
+    return view.get_serializer(*args, **kwargs).data
+
+
+async def conditional_response(request, view, validators, render, meta=None):
+    """Async counterpart of ConditionalCardReadMixin.conditional_response."""
+    if is_conditional(request):
+        current = await validators()
+        if current is not None:
+            response = not_modified(request, validator_headers(*current))
+            if response is not None:
+                return response
+    view.fetched_cards = None
+    response = await render()
+    if response is not None and response.status_code == 200:
+        shown = view.shown_validators(request, response, meta)
+        if shown is not None:
+            for header, value in validator_headers(*shown).items():
+                response[header] = value
+    return response
+
+
+async def cached_response(request, cache_key, render):
+    """Async counterpart of CachedCardReadMixin, sharing its cache entries."""
+    if not caches_responses_for(request):
+        return await render()
+    key = await cache_key()
+    entry = await acached_entry(key)
+    if entry is not None:
+        headers = hit_headers(entry)
+        return not_modified(request, headers) or JSONResponse(entry["data"], headers)
+
+    response = await render()
+    if response is None:
+        return None
+    return await astore_response(key, response)
+
+
+def plain_card_list(request):
+    return not any(param in request.GET for param in CARD_LIST_SYNC_PARAMS)
+
+
+def all_fields(request):
+    return not any(param in request.GET for param in SPARSE_FIELD_PARAMS)
+
+
+@async_read_view(
+    CardViewSet.as_view({"get": "list", "post": "create"}), handles=plain_card_list
+)
+async def card_list(request):
+    view = sync_view_instance(CardViewSet, request, action="list")
+
+    async def validators():
+        try:
+            return await sync_to_async(view.list_validators)(request)
+        except NotFound:
+            return None
+
+    return await cached_response(
+        request,
+        partial(alist_cache_key, request),
+        lambda: conditional_response(
+            request, view, validators, lambda: paginated_response(view), page_meta
+        ),
+    )
+
+
+@async_read_view(
+    CardViewSet.as_view(
+        {
+            "get": "retrieve",
+            "put": "update",
+            "patch": "partial_update",
+            "delete": "destroy",
+        }
+    ),
+    handles=all_fields,
+)
+async def card_detail(request, pk):
+    view = sync_view_instance(CardViewSet, request, action="retrieve", pk=pk)
+    queryset = view.get_queryset().filter(pk=pk)
+
+    async def render():
+        if fast_card_reads():
+            rows = await sync_to_async(list)(card_rows(queryset))
+            if not rows:
+                return None
+            view.fetched_cards = rows
+            cards = await sync_to_async(serialize_cards)(rows)
+            return JSONResponse(cards[0])
+        card = await queryset.afirst()
+        if card is None:
+            return None
+        view.fetched_cards = [card]
+        return JSONResponse(await sync_to_async(serializer_data)(view, card))
+
+    return await cached_response(
+        request,
+        partial(adetail_cache_key, request, pk),
+        lambda: conditional_response(
+            request, view, partial(acard_validators, request, queryset), render
+        ),
+    )
+
+
+@async_read_view(FeedView.as_view(), handles=all_fields)
+async def feed(request):
+    if not request.user.is_authenticated:
+        return None
+    return await paginated_response(sync_view_instance(FeedView, request))
+
+
+@async_read_view(FollowersListView.as_view())
+async def followers(request):
+    if not request.user.is_authenticated:
+        return None
+    return await paginated_response(sync_view_instance(FollowersListView, request))
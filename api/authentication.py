@@ -0,0 +1,90 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+
+def token_cache_key(key):
+    # hash so raw tokens never show up in the cache's key space
+    return f"auth:token:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def forget_token(key):
+    cache.delete(token_cache_key(key))
+
+
+def token_user(user_id):
+    """
+    The user for a cached token lookup. Only id and is_active are loaded;
+    the views only need the user's pk, and any other field is fetched from
+    the database if accessed.
+    """
+    return get_user_model().from_db(
+        DEFAULT_DB_ALIAS, ["id", "is_active"], [user_id, True]
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that keeps successful token lookups in the cache for
+    AUTH_TOKEN_CACHE_TIMEOUT seconds, so most authenticated requests skip the
+    token/user query. Only (user id, is_active) is cached, never the user row.
+    Entries are dropped when the token is deleted (e.g. on logout) or its user
+    is saved; see api.signals. With a per-process cache another worker would
+    keep serving a dropped entry, so caching is off unless the cache is shared.
+    """
+
+    def authenticate_credentials(self, key):
+        timeout = settings.AUTH_TOKEN_CACHE_TIMEOUT
+        if not timeout:
+            return super().authenticate_credentials(key)
+
+        entry = cache.get(token_cache_key(key))
+        if entry is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(token_cache_key(key), (user.pk, user.is_active), timeout)
+            return (user, token)
+        user_id, is_active = entry
+        if not is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+        user = token_user(user_id)
+        return (user, Token(key=key, user=user))
+
+
+async def aauthenticate(request):
+    """
+    Async counterpart of CachedTokenAuthentication for api.async_views.
+    Returns the token's user, or AnonymousUser when no token is sent. Returns
+    None if the header is malformed or the token is invalid or inactive, in
+    which case callers defer to the sync view for DRF's error response.
+    """
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != b"token":
+        return AnonymousUser()
+    if len(auth) != 2:
+        return None
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        return None
+
+    timeout = settings.AUTH_TOKEN_CACHE_TIMEOUT
+    entry = await cache.aget(token_cache_key(key)) if timeout else None
+    if entry is not None:
+        user_id, is_active = entry
+        return token_user(user_id) if is_active else None
+    try:
+        token = await Token.objects.select_related("user").aget(key=key)
+    except Token.DoesNotExist:
+        return None
+    if not token.user.is_active:
+        return None
+    if timeout:
+        await cache.aset(token_cache_key(key), (token.user_id, True), timeout)
+    return token.user
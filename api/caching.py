@@ -0,0 +1,200 @@
+"""
+Response caching for anonymous card reads.
+
+Cached entries are namespaced by a version token: one for all list pages and
+one per card for detail responses. Invalidating swaps the token, so stale
+entries become unreachable without scanning keys and simply expire. Any
+card change may reorder list pages, so it swaps the list token too.
+Tokens are swapped once the change commits, so a concurrent read can't
+cache the old rows under the new token. With several worker processes the
+cache must be shared (CACHE_URL) for every worker to see the swap; see
+SHARED_CACHE in the settings.
+"""
+
+import hashlib
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from .conditional import not_modified
+
+LIST_VERSION_KEY = "cards:list:version"
+HITS_KEY = "cards:cache:hits"
+MISSES_KEY = "cards:cache:misses"
+CACHED_HEADERS = ("ETag", "Last-Modified")
+
+
+def _detail_version_key(pk):
+    return f"cards:detail:{pk}:version"
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(key, version, None)
+    return version
+
+
+async def _aversion(key):
+    version = await cache.aget(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        await cache.aset(key, version, None)
+    return version
+
+
+def _path_hash(request):
+    return hashlib.md5(request.get_full_path().encode()).hexdigest()
+
+
+def list_cache_key(request):
+    return f"cards:list:{_version(LIST_VERSION_KEY)}:{_path_hash(request)}"
+
+
+def detail_cache_key(request, pk):
+    version = _version(_detail_version_key(pk))
+    return f"cards:detail:{pk}:{version}:{_path_hash(request)}"
+
+
+async def alist_cache_key(request):
+    return f"cards:list:{await _aversion(LIST_VERSION_KEY)}:{_path_hash(request)}"
+
+
+async def adetail_cache_key(request, pk):
+    version = await _aversion(_detail_version_key(pk))
+    return f"cards:detail:{pk}:{version}:{_path_hash(request)}"
+
+
+def invalidate_card(pk):
+    invalidate_cards([pk])
+
+
+def invalidate_cards(pks):
+    transaction.on_commit(partial(_swap_versions, list(pks)))
+
+
+def _swap_versions(pks):
+    versions = {_detail_version_key(pk): uuid.uuid4().hex for pk in pks}
+    cache.set_many({LIST_VERSION_KEY: uuid.uuid4().hex, **versions}, None)
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+async def _acount(key):
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, None)
+        await cache.aincr(key)
+
+
+def caches_responses_for(request):
+    """Whether `request` is answered from the response cache."""
+    return settings.CARD_CACHE_TIMEOUT > 0 and not request.user.is_authenticated
+
+
+def cached_entry(key):
+    """The cache entry stored under `key`, counting a hit, or None."""
+    entry = cache.get(key)
+    if entry is not None:
+        _count(HITS_KEY)
+    return entry
+
+
+async def acached_entry(key):
+    entry = await cache.aget(key)
+    if entry is not None:
+        await _acount(HITS_KEY)
+    return entry
+
+
+def hit_headers(entry):
+    """The headers of a response served from a cache entry."""
+    return {**entry["headers"], "X-Cache": "HIT"}
+
+
+def response_entry(response):
+    """The cache entry for a response: its data and validator headers."""
+    return {
+        "data": response.data,
+        "headers": {
+            header: response[header]
+            for header in CACHED_HEADERS
+            if response.has_header(header)
+        },
+    }
+
+
+def store_response(key, response):
+    """Count a miss and cache `response` under `key` if it succeeded."""
+    _count(MISSES_KEY)
+    if response.status_code == 200:
+        cache.set(key, response_entry(response), settings.CARD_CACHE_TIMEOUT)
+    response["X-Cache"] = "MISS"
+    return response
+
+
+async def astore_response(key, response):
+    await _acount(MISSES_KEY)
+    if response.status_code == 200:
+        await cache.aset(key, response_entry(response), settings.CARD_CACHE_TIMEOUT)
+    response["X-Cache"] = "MISS"
+    return response
+
+
+def cache_stats():
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {"hits": counts.get(HITS_KEY, 0), "misses": counts.get(MISSES_KEY, 0)}
+
+
+class CachedCardReadMixin:
+    """
+    Serve anonymous list and retrieve requests from the cache for
+    CARD_CACHE_TIMEOUT seconds. Responses say whether they were cached in
+    an X-Cache header. Cached ETag/Last-Modified headers are kept so
+    conditional requests can get a 304 without touching the database.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_response_cache(request):
+            return super().list(request, *args, **kwargs)
+        key = list_cache_key(request)
+        return self.cached_response(key) or self.cache_response(
+            key, super().list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_response_cache(request):
+            return super().retrieve(request, *args, **kwargs)
+        key = detail_cache_key(
+            request, kwargs[self.lookup_url_kwarg or self.lookup_field]
+        )
+        return self.cached_response(key) or self.cache_response(
+            key, super().retrieve(request, *args, **kwargs)
+        )
+
+    def use_response_cache(self, request):
+        return caches_responses_for(request)
+
+    def cached_response(self, key):
+        entry = cached_entry(key)
+        if entry is None:
+            return None
+        headers = hit_headers(entry)
+        return not_modified(self.request, headers) or Response(
+            entry["data"], headers=headers
+        )
+
+    def cache_response(self, key, response):
+        return store_response(key, response)
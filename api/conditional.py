@@ -0,0 +1,187 @@
+"""
+Conditional GET support for card reads.
+
+ETags are derived from the cards a response shows: their ids and
+updated_at, plus the page's count and links for lists. Full responses take
+them from the cards already fetched, so sending validators costs no query.
+Only requests carrying If-None-Match or If-Modified-Since fetch the page's
+card keys and timestamps up front, so a 304 skips loading styles and
+serializing. Whatever else a card shows bumps its updated_at when it
+changes: its styles (see api.styles.styles_changed) and its creator's
+username (see api.signals).
+
+Last-Modified, the latest updated_at, is only sent for a single card (and
+its styles). A list page has none: deleting a card moves older cards onto
+the page without any timestamp on it advancing.
+"""
+
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+# what validators are computed from
+VALIDATOR_FIELDS = ("id", "created_at", "updated_at")
+
+
+def is_conditional(request):
+    return "If-None-Match" in request.headers or "If-Modified-Since" in request.headers
+
+
+def page_validators(request, cards, meta=None, dated=True):
+    """
+    Return (etag, last_modified timestamp) for a response showing `cards`
+    (instances or values() rows) and, for list pages, `meta` (the count and
+    links), or None if there are no cards. The ETag also covers the request
+    path so different searches and renderings don't collide. last_modified
+    is None unless `dated`.
+    """
+    stamps = [
+        (
+            (card["id"], card["updated_at"])
+            if isinstance(card, dict)
+            else (card.pk, card.updated_at)
+        )
+        for card in cards
+    ]
+    if not stamps:
+        return None
+    last = max(updated_at for _, updated_at in stamps)
+    source = ":".join(
+        [
+            request.get_full_path(),
+            repr(sorted((meta or {}).items())),
+            ",".join(f"{pk}@{updated_at.isoformat()}" for pk, updated_at in stamps),
+        ]
+    )
+    etag = f'W/"{hashlib.md5(source.encode()).hexdigest()}"'
+    return etag, int(last.timestamp()) if dated else None
+
+
+def card_validators(request, queryset):
+    """page_validators for the cards in queryset, loading only their timestamps."""
+    return page_validators(request, queryset.order_by("pk").values(*VALIDATOR_FIELDS))
+
+
+async def acard_validators(request, queryset):
+    rows = queryset.order_by("pk").values(*VALIDATOR_FIELDS)
+    return page_validators(request, [row async for row in rows])
+
+
+def page_meta(data):
+    """The count and links of a paginated response's data, without the results."""
+    return {key: value for key, value in data.items() if key != "results"}
+
+
+def validator_headers(etag, last_modified):
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def not_modified(request, headers):
+    """Return a 304 response if the request's conditions match headers."""
+    response = get_conditional_response(
+        request,
+        etag=headers.get("ETag"),
+        last_modified=parse_http_date_safe(headers.get("Last-Modified", "")),
+    )
+    if response is not None:
+        for header, value in headers.items():
+            response[header] = value
+    return response
+
+
+class ConditionalCardReadMixin:
+    """
+    Send an ETag on list and retrieve responses, and Last-Modified on
+    retrieve ones, and answer If-None-Match / If-Modified-Since with a 304
+    computed from card timestamps. Views whose response isn't a page of cards (e.g. a card's
+    styles) name the cards deciding it with get_validator_queryset.
+    """
+
+    fetched_cards = None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, self.list_validators, page_meta, super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, self.retrieve_validators, None, super().retrieve, *args, **kwargs
+        )
+
+    def get_validator_queryset(self):
+        """The cards deciding whether the response changed, or None for those shown."""
+        return None
+
+    def paginate_queryset(self, queryset):
+        self.fetched_cards = super().paginate_queryset(queryset)
+        return self.fetched_cards
+
+    def get_object(self):
+        card = super().get_object()
+        self.fetched_cards = [card]
+        return card
+
+    def list_validators(self, request, *args, **kwargs):
+        """Validators for the current list page, loading only card timestamps."""
+        queryset = self.get_validator_queryset()
+        if queryset is not None:
+            return card_validators(request, queryset)
+        rows = (
+            self.filter_queryset(self.get_queryset())
+            .prefetch_related(None)
+            .values(*VALIDATOR_FIELDS)
+        )
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return page_validators(request, rows, dated=False)
+        return page_validators(
+            request,
+            page,
+            page_meta(self.get_paginated_response([]).data),
+            dated=False,
+        )
+
+    def retrieve_validators(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.get_queryset().filter(
+            **{self.lookup_field: kwargs[lookup_url_kwarg]}
+        )
+        try:
+            return card_validators(request, queryset)
+        except (TypeError, ValueError, ValidationError):
+            return None
+
+    def shown_validators(self, request, response, meta=None):
+        """Validators for a full response, from the cards it fetched."""
+        queryset = self.get_validator_queryset()
+        if queryset is not None:
+            return card_validators(request, queryset)
+        if self.fetched_cards is None:
+            return None
+        if meta is None:
+            return page_validators(request, self.fetched_cards)
+        return page_validators(
+            request, self.fetched_cards, meta(response.data), dated=False
+        )
+
+    def conditional_response(self, request, validators, meta, view, *args, **kwargs):
+        if is_conditional(request):
+            current = validators(request, *args, **kwargs)
+            if current is not None:
+                response = not_modified(request, validator_headers(*current))
+                if response is not None:
+                    return response
+        self.fetched_cards = None
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            shown = self.shown_validators(request, response, meta)
+            if shown is not None:
+                for header, value in validator_headers(*shown).items():
+                    response[header] = value
+        return response
@@ -0,0 +1,70 @@
+"""
+Denormalized follower, following and card counts on User.
+
+Counts are adjusted with single UPDATE ... SET n = n + delta statements from
+the signal handlers in api.signals, inside the same transaction as the
+write that changed them. Decrements stop at 0, so a counter that has drifted
+low can't violate the columns' non-negative CHECK constraint and fail the
+write; reconcile_counters() recomputes them in bulk.
+"""
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Card, FollowRelationship, User
+
+
+def _shifted(field, delta):
+    return Greatest(F(field) + delta, 0)
+
+
+def adjust_follow_counts(follower_id, followed_user_id, delta):
+    adjust_follow_counts_many(follower_id, [followed_user_id], delta)
+
+
+def adjust_follow_counts_many(follower_id, followed_user_ids, delta):
+    """Count (or uncount) one user following each of followed_user_ids."""
+    if not followed_user_ids:
+        return
+    User.objects.filter(pk=follower_id).update(
+        following_count=_shifted("following_count", delta * len(followed_user_ids))
+    )
+    User.objects.filter(pk__in=followed_user_ids).update(
+        follower_count=_shifted("follower_count", delta)
+    )
+
+
+def adjust_card_count(user_id, delta):
+    User.objects.filter(pk=user_id).update(card_count=_shifted("card_count", delta))
+
+
+def _count_subquery(queryset, group_by):
+    counts = (
+        queryset.filter(**{group_by: OuterRef("pk")})
+        .order_by()
+        .values(group_by)
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def expected_counts():
+    active = FollowRelationship.objects.active()
+    return {
+        "follower_count": _count_subquery(active, "followed_user"),
+        "following_count": _count_subquery(active, "follower"),
+        "card_count": _count_subquery(Card.objects.filter(draft=False), "creator"),
+    }
+
+
+def reconcile_counters(users=None):
+    """
+    Fix any counter that has drifted from the underlying rows, one UPDATE per
+    counter. Returns how many users were corrected for each counter.
+    """
+    users = User.objects.all() if users is None else users
+    return {
+        field: users.exclude(**{field: expected}).update(**{field: expected})
+        for field, expected in expected_counts().items()
+    }
@@ -0,0 +1,162 @@
+"""
+Read-only fast path for card responses.
+
+CardSerializer builds each card through DRF's field machinery: a model
+instance per card and per style, then get_attribute and to_representation
+for every field. For GETs, serialize_cards builds the same dicts straight
+from .values() rows, with the styles of a whole page fetched in one query
+and grouped by card (or read from Card.compact_styles, see api.styles).
+The field order, sources and conversions are read from CardSerializer
+itself, so its output stays byte-identical (see FastCardSerializationTests);
+only fields whose to_representation would return the database value
+unchanged skip the field call.
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .metrics import timed_serialization
+from .models import CardStyleDeclaration
+from .serializers import CardSerializer, CardStyleDeclarationSerializer
+from .sparse import ALWAYS_SELECTED
+
+# to_representation methods that return database values as they are
+PASSTHROUGH = {
+    serializers.BooleanField.to_representation,
+    serializers.CharField.to_representation,
+    serializers.IntegerField.to_representation,
+    serializers.ReadOnlyField.to_representation,
+}
+
+
+def readable_fields(serializer):
+    """(output key, values() lookup, converter or None) for each field, in order."""
+    return [
+        (
+            name,
+            "__".join(field.source_attrs),
+            (
+                None
+                if type(field).to_representation in PASSTHROUGH
+                else field.to_representation
+            ),
+        )
+        for name, field in serializer.fields.items()
+        if not field.write_only
+    ]
+
+
+# per style storage mode, as CardSerializer's styles field depends on it
+_card_fields = {}
+STYLE_FIELDS = readable_fields(CardStyleDeclarationSerializer())
+
+
+def represent(row, fields):
+    return {
+        name: (
+            value
+            if (value := row[lookup]) is None or convert is None
+            else convert(value)
+        )
+        for name, lookup, convert in fields
+    }
+
+
+def card_fields(fields=None):
+    mode = settings.CARD_STYLE_STORAGE
+    if mode not in _card_fields:
+        _card_fields[mode] = readable_fields(CardSerializer())
+    if fields is None:
+        return _card_fields[mode]
+    return [field for field in _card_fields[mode] if field[0] in fields]
+
+
+def card_rows(queryset, fields=None):
+    """A card queryset as the .values() rows serialize_cards takes."""
+    # "styles" is the declaration rows, fetched by serialize_cards
+    lookups = [lookup for _, lookup, _ in card_fields(fields) if lookup != "styles"]
+    return queryset.prefetch_related(None).values(
+        *dict.fromkeys(ALWAYS_SELECTED + lookups)
+    )
+
+
+@timed_serialization()
+def serialize_cards(rows, fields=None):
+    """
+    What CardSerializer(cards, many=True, fields=fields).data holds, for
+    card_rows() rows.
+    """
+    rows = list(rows)
+    plan = card_fields(fields)
+    styles = defaultdict(list)
+    if rows and any(lookup == "styles" for _, lookup, _ in plan):
+        # the styles prefetch's query, so styles come back in the same order
+        for style in (
+            CardStyleDeclaration.objects.filter(card__in=[row["id"] for row in rows])
+            .order_by("property")
+            .values()
+        ):
+            styles[style["card_id"]].append(represent(style, STYLE_FIELDS))
+    cards = []
+    for row in rows:
+        card = {}
+        for name, lookup, convert in plan:
+            if lookup == "styles":
+                card[name] = styles[row["id"]]
+                continue
+            value = row[lookup]
+            card[name] = value if value is None or convert is None else convert(value)
+        cards.append(card)
+    return cards
+
+
+def fast_card_reads():
+    return settings.CARD_FAST_SERIALIZATION
+
+
+class FastCardReadMixin:
+    """
+    Serve list and retrieve GETs of CardSerializer views through
+    serialize_cards when CARD_FAST_SERIALIZATION is on, honoring the view's
+    sparse_fields if it has them (see api.sparse). Retrieve doesn't
+    check object permissions, so only use it where reading needs none.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not fast_card_reads():
+            return super().list(request, *args, **kwargs)
+        return self.card_list_response(self.filter_queryset(self.get_queryset()))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not fast_card_reads():
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = getattr(self, "sparse_fields", None)
+        try:
+            rows = list(
+                card_rows(
+                    queryset.filter(**{self.lookup_field: kwargs[lookup_url_kwarg]}),
+                    fields,
+                )
+            )
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        if not rows:
+            raise Http404
+        # the card shown, for ConditionalCardReadMixin's validators
+        self.fetched_cards = rows
+        return Response(serialize_cards(rows, fields)[0])
+
+    def card_list_response(self, queryset):
+        fields = getattr(self, "sparse_fields", None)
+        rows = card_rows(queryset, fields)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(serialize_cards(rows, fields))
+        return self.get_paginated_response(serialize_cards(page, fields))
@@ -0,0 +1,141 @@
+"""
+Home feed assembly.
+
+In the default "read" mode a feed page is one query joining cards to the
+reader's active follow relationships. In "hybrid" mode cards are also
+fanned out on write into FeedEntry rows for each follower, except for
+creators with more than FEED_FANOUT_MAX_FOLLOWERS followers, whose cards
+are still pulled in at read time so one post doesn't write millions of rows.
+Which of the two happened is recorded on the card (Card.fanned_out) when
+it is published, so a creator crossing the threshold later doesn't move
+their earlier cards out of their followers' feeds.
+"""
+
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import Card, FeedEntry, FollowRelationship, User
+
+BATCH_SIZE = 1000
+
+
+def hybrid_mode():
+    return settings.FEED_MODE == "hybrid"
+
+
+def active_follower_ids(user_id):
+    return (
+        FollowRelationship.objects.active()
+        .filter(followed_user_id=user_id)
+        .values_list("follower_id", flat=True)
+    )
+
+
+def is_high_follower(user_id):
+    return User.objects.filter(
+        pk=user_id, follower_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).exists()
+
+
+def feed_queryset(user):
+    followed = (
+        FollowRelationship.objects.active()
+        .filter(follower=user)
+        .values("followed_user_id")
+    )
+    cards = Card.objects.filter(draft=False)
+    if not hybrid_mode():
+        return cards.filter(creator_id__in=followed)
+    return cards.filter(
+        Q(id__in=FeedEntry.objects.filter(user=user).values("card_id"))
+        | Q(creator_id__in=followed, fanned_out=False)
+    )
+
+
+def _insert_entries(pairs):
+    pairs = iter(pairs)
+    while batch := list(islice(pairs, BATCH_SIZE)):
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(user_id=user_id, card_id=card_id) for user_id, card_id in batch],
+            ignore_conflicts=True,
+        )
+
+
+def fan_out_card(card):
+    """
+    Push a newly published card into its creator's followers' feeds, unless
+    the creator has too many followers, and record which was done.
+    """
+    if not hybrid_mode() or card.draft:
+        return
+    fanned_out = not is_high_follower(card.creator_id)
+    if fanned_out:
+        follower_ids = active_follower_ids(card.creator_id).iterator(
+            chunk_size=BATCH_SIZE
+        )
+        _insert_entries((follower_id, card.pk) for follower_id in follower_ids)
+    if card.fanned_out != fanned_out:
+        Card.objects.filter(pk=card.pk).update(fanned_out=fanned_out)
+        card.fanned_out = fanned_out
+
+
+def backfill_follow(follower_id, followed_user_id, limit=None):
+    backfill_follows(follower_id, [followed_user_id], limit)
+
+
+def backfill_follows(follower_id, followed_user_ids, limit=None):
+    """
+    Copy each creator's most recent fanned out cards into one follower's
+    feed (the rest are pulled at read time).
+    """
+    if not hybrid_mode():
+        return
+    card_ids = (
+        Card.objects.filter(
+            creator_id__in=followed_user_ids, draft=False, fanned_out=True
+        )
+        .annotate(
+            recency=Window(
+                RowNumber(),
+                partition_by=F("creator_id"),
+                order_by=[F("created_at").desc(), F("id").desc()],
+            )
+        )
+        .filter(recency__lte=limit or settings.FEED_BACKFILL_LIMIT)
+        .values_list("id", flat=True)
+    )
+    _insert_entries((follower_id, card_id) for card_id in card_ids)
+
+
+def remove_follow(follower_id, followed_user_id):
+    remove_follows(follower_id, [followed_user_id])
+
+
+def remove_follows(follower_id, followed_user_ids):
+    """Drop creators' cards from a former (or blocked) follower's feed."""
+    FeedEntry.objects.filter(
+        user_id=follower_id, card__creator_id__in=followed_user_ids
+    ).delete()
+
+
+def backfill_creator(creator_id, limit=None):
+    """
+    Deliver a creator's most recent published cards to all active followers
+    and mark them fanned out, so they are no longer pulled.
+    """
+    if is_high_follower(creator_id):
+        return 0
+    card_ids = list(
+        Card.objects.filter(creator_id=creator_id, draft=False)
+        .order_by("-created_at", "-id")
+        .values_list("id", flat=True)[: limit or settings.FEED_BACKFILL_LIMIT]
+    )
+    follower_ids = active_follower_ids(creator_id).iterator(chunk_size=BATCH_SIZE)
+    _insert_entries(
+        (follower_id, card_id) for follower_id in follower_ids for card_id in card_ids
+    )
+    Card.objects.filter(pk__in=card_ids).update(fanned_out=True)
+    return len(card_ids)
@@ -0,0 +1,140 @@
+"""
+Following and unfollowing many users at once.
+
+Both operations run in one transaction with a fixed number of queries. They
+write with a single INSERT / DELETE, which skip the per-row signal handlers,
+so counters and materialized feeds are adjusted here in bulk, from the rows
+each statement reports it actually wrote. The follower's row is locked first,
+so two bulk requests from the same user run one after the other.
+"""
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .counters import adjust_follow_counts_many
+from .feed import backfill_follows, remove_follows
+from .models import FollowRelationship, User
+
+FOLLOWED = "followed"
+ALREADY_FOLLOWING = "already_following"
+NOT_FOUND = "not_found"
+CANNOT_FOLLOW_SELF = "cannot_follow_self"
+UNFOLLOWED = "unfollowed"
+NOT_FOLLOWING = "not_following"
+
+
+def _lock_follower(follower):
+    User.objects.select_for_update().only("pk").get(pk=follower.pk)
+
+
+@transaction.atomic
+def follow_users(follower, user_ids):
+    """Follow each user in user_ids. Returns {user_id: outcome}."""
+    user_ids = list(dict.fromkeys(user_ids))
+    _lock_follower(follower)
+    targets = dict(
+        User.objects.filter(pk__in=user_ids)
+        .annotate(
+            following=Exists(
+                FollowRelationship.objects.filter(
+                    follower=follower, followed_user=OuterRef("pk")
+                )
+            )
+        )
+        .values_list("pk", "following")
+    )
+
+    outcomes = {}
+    for user_id in user_ids:
+        if user_id == follower.pk:
+            outcomes[user_id] = CANNOT_FOLLOW_SELF
+        elif user_id not in targets:
+            outcomes[user_id] = NOT_FOUND
+        elif targets[user_id]:
+            outcomes[user_id] = ALREADY_FOLLOWING
+        else:
+            outcomes[user_id] = FOLLOWED
+
+    new_ids = [user_id for user_id, outcome in outcomes.items() if outcome == FOLLOWED]
+    inserted = _insert_follows(follower.pk, new_ids)
+    for user_id in set(new_ids) - set(inserted):
+        # followed by a concurrent request since the check above
+        outcomes[user_id] = ALREADY_FOLLOWING
+    adjust_follow_counts_many(follower.pk, inserted, 1)
+    backfill_follows(follower.pk, inserted)
+    return outcomes
+
+
+def _insert_follows(follower_id, user_ids):
+    """
+    Insert active follows of user_ids, skipping any that exist, and return
+    the ids of the rows actually inserted. bulk_create(ignore_conflicts=True)
+    can't tell which rows it skipped, so this is a plain INSERT ... ON
+    CONFLICT DO NOTHING RETURNING (PostgreSQL, SQLite 3.35+).
+    """
+    if not user_ids:
+        return []
+    meta = FollowRelationship._meta
+    columns = ["follower", "followed_user", "status", "created_at"]
+    created_at = meta.get_field("created_at").get_db_prep_save(
+        timezone.now(), connection
+    )
+    rows = [
+        (follower_id, user_id, FollowRelationship.Status.ACTIVE.value, created_at)
+        for user_id in user_ids
+    ]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(meta.db_table)} "
+            f"({', '.join(quote(meta.get_field(name).column) for name in columns)}) "
+            f"VALUES {', '.join(['(%s, %s, %s, %s)'] * len(rows))} "
+            f"ON CONFLICT DO NOTHING "
+            f"RETURNING {quote(meta.get_field('followed_user').column)}",
+            [value for row in rows for value in row],
+        )
+        return [user_id for (user_id,) in cursor.fetchall()]
+
+
+@transaction.atomic
+def unfollow_users(follower, user_ids):
+    """Unfollow each user in user_ids. Returns {user_id: outcome}."""
+    user_ids = list(dict.fromkeys(user_ids))
+    _lock_follower(follower)
+    statuses = _delete_follows(follower.pk, user_ids)
+    active_ids = [
+        user_id
+        for user_id, status in statuses.items()
+        if status == FollowRelationship.Status.ACTIVE
+    ]
+    adjust_follow_counts_many(follower.pk, active_ids, -1)
+    if statuses:
+        remove_follows(follower.pk, list(statuses))
+    return {
+        user_id: UNFOLLOWED if user_id in statuses else NOT_FOLLOWING
+        for user_id in user_ids
+    }
+
+
+def _delete_follows(follower_id, user_ids):
+    """
+    Delete the follower's follows of user_ids and return {user_id: status}
+    for the rows actually deleted. A plain DELETE ... RETURNING rather than
+    QuerySet.delete(), which would load every row and send the per-row
+    post_delete signals that adjust counters and feeds one follow at a time.
+    """
+    if not user_ids:
+        return {}
+    meta = FollowRelationship._meta
+    quote = connection.ops.quote_name
+    followed_column = quote(meta.get_field("followed_user").column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(meta.db_table)} "
+            f"WHERE {quote(meta.get_field('follower').column)} = %s "
+            f"AND {followed_column} IN ({', '.join(['%s'] * len(user_ids))}) "
+            f"RETURNING {followed_column}, {quote(meta.get_field('status').column)}",
+            [follower_id, *user_ids],
+        )
+        return dict(cursor.fetchall())
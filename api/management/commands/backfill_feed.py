@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.feed import backfill_creator
+from api.models import Card, FeedEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Populate materialized feeds with each creator's most recent published "
+        "cards, which are then no longer pulled at read time. Creators above "
+        "FEED_FANOUT_MAX_FOLLOWERS are skipped since their cards are read at "
+        "request time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--per-creator",
+            type=int,
+            default=settings.FEED_BACKFILL_LIMIT,
+            help="How many recent cards to deliver per creator.",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help=(
+                "Delete all existing feed entries first, so every card is "
+                "pulled until delivered again."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if settings.FEED_MODE != "hybrid":
+            self.stderr.write(
+                self.style.WARNING(
+                    "FEED_MODE is not 'hybrid'; feed entries will not be read."
+                )
+            )
+        if options["clear"]:
+            deleted, _ = FeedEntry.objects.all().delete()
+            Card.objects.filter(fanned_out=True).update(fanned_out=False)
+            self.stdout.write(f"Deleted {deleted} feed entries.")
+
+        creator_ids = (
+            Card.objects.filter(draft=False)
+            .values_list("creator_id", flat=True)
+            .order_by("creator_id")
+            .distinct()
+        )
+        creators = cards = 0
+        for creator_id in creator_ids.iterator():
+            delivered = backfill_creator(creator_id, options["per_creator"])
+            creators += 1
+            cards += delivered
+            if creators % 1000 == 0:
+                self.stdout.write(f"{creators} creators processed...")
+        self.stdout.write(
+            self.style.SUCCESS(f"Delivered {cards} cards from {creators} creators.")
+        )
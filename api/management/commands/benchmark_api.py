@@ -0,0 +1,312 @@
+import json
+import random
+import re
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import URLResolver, reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api import urls as api_urls
+from api.models import Card, CardStyleDeclaration, FollowRelationship, User
+from api.seeding import USERNAME_PREFIX, seed
+
+SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+class Fixture:
+    """Ids the benchmark requests are built from, drawn from the seeded data."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        seeded = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        # the busiest seeded user, so feeds and follower lists aren't empty
+        self.user = (
+            seeded.filter(card_count__gt=0).order_by("-following_count", "pk").first()
+        )
+        if self.user is None:
+            raise CommandError("No seeded data found; run with --seed.")
+        self.token = Token.objects.get_or_create(user=self.user)[0].key
+        self.user_ids = list(seeded.values_list("pk", flat=True)[:1000])
+        self.card_ids = list(
+            Card.objects.filter(draft=False, creator__in=seeded).values_list(
+                "pk", flat=True
+            )[:1000]
+        )
+        self.own_card_ids = list(self.user.cards.values_list("pk", flat=True))
+        self.followed_ids = list(
+            self.user.relationship_as_follower.values_list(
+                "followed_user_id", flat=True
+            )
+        )
+        followed = set(self.followed_ids) | {self.user.pk}
+        self.unfollowed_ids = [pk for pk in self.user_ids if pk not in followed]
+
+    def pick(self, ids, k=None):
+        if k is None:
+            return self.rng.choice(ids)
+        return self.rng.sample(ids, min(k, len(ids)))
+
+
+# (method, URL name) -> function of a Fixture returning (path, request body)
+ROUTES = {
+    ("GET", "api-root"): lambda f: (reverse("api-root"), None),
+    ("GET", "cards-list"): lambda f: (reverse("cards-list"), None),
+    ("GET", "cards-me"): lambda f: (reverse("cards-me"), None),
+    ("GET", "cards-detail"): lambda f: (
+        reverse("cards-detail", args=[f.pick(f.card_ids)]),
+        None,
+    ),
+    ("POST", "cards-list"): lambda f: (
+        reverse("cards-list"),
+        {"front_text": "Benchmark card", "back_text": "Written and rolled back"},
+    ),
+    ("PATCH", "cards-detail"): lambda f: (
+        reverse("cards-detail", args=[f.pick(f.own_card_ids)]),
+        {"front_text": "Edited"},
+    ),
+    ("DELETE", "cards-detail"): lambda f: (
+        reverse("cards-detail", args=[f.pick(f.own_card_ids)]),
+        None,
+    ),
+    ("GET", "card-styles"): lambda f: (
+        reverse("card-styles", args=[f.pick(f.card_ids)]),
+        None,
+    ),
+    ("POST", "card-styles"): lambda f: (
+        reverse("card-styles", args=[f.pick(f.own_card_ids)]),
+        {"property": "benchmark", "value": "1"},
+    ),
+    ("PATCH", "card-style-edit"): lambda f: (
+        reverse("card-style-edit", args=[f.pick(f.own_card_ids)]),
+        [
+            {"property": "color", "value": "#000000"},
+            {"property": "italic", "boolValue": True},
+        ],
+    ),
+    ("GET", "feed"): lambda f: (reverse("feed"), None),
+    ("GET", "user-profile"): lambda f: (
+        reverse("user-profile", args=[f.pick(f.user_ids)]),
+        None,
+    ),
+    ("GET", "followed"): lambda f: (reverse("followed"), None),
+    ("GET", "followers"): lambda f: (reverse("followers"), None),
+    ("GET", "suggestions"): lambda f: (reverse("suggestions"), None),
+    ("POST", "follows"): lambda f: (
+        reverse("follows"),
+        {"followed_user": f.pick(f.unfollowed_ids)},
+    ),
+    ("POST", "follows-bulk"): lambda f: (
+        reverse("follows-bulk"),
+        {"user_ids": f.pick(f.unfollowed_ids, 20)},
+    ),
+    ("POST", "unfollow-bulk"): lambda f: (
+        reverse("unfollow-bulk"),
+        {"user_ids": f.pick(f.followed_ids, 20)},
+    ),
+    ("DELETE", "unfollow"): lambda f: (
+        reverse("unfollow", args=[f.pick(f.followed_ids)]),
+        None,
+    ),
+    ("GET", "user-me"): lambda f: (reverse("user-me"), None),
+}
+
+
+def route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from route_names(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+
+def quantile(timings, q):
+    return statistics.quantiles(timings, n=100, method="inclusive")[q - 1]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure latency percentiles and query counts for the API routes "
+        "against seeded data in the configured (local!) database. Writes run "
+        "inside transactions that are rolled back. Save a JSON report with "
+        "--output and compare it with a later run using --compare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed", action="store_true", help="Seed data first if none exists."
+        )
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--follows-per-user", type=int, default=20)
+        parser.add_argument("--cards-per-user", type=int, default=10)
+        parser.add_argument("--styles-per-card", type=int, default=4)
+        parser.add_argument("--random-seed", type=int, default=0)
+        parser.add_argument("--samples", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--route",
+            action="append",
+            dest="routes",
+            help="Only benchmark URL names matching this (repeatable).",
+        )
+        parser.add_argument("--output", help="Write the report to this JSON file.")
+        parser.add_argument("--compare", help="Compare with an earlier JSON report.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=20,
+            help="Percent p50 slowdown to flag as a regression.",
+        )
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="Exit with an error if any route regressed.",
+        )
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            if User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+                self.stdout.write("Seeded data found; not seeding again.")
+            else:
+                seed(
+                    users=options["users"],
+                    follows_per_user=options["follows_per_user"],
+                    cards_per_user=options["cards_per_user"],
+                    styles_per_card=options["styles_per_card"],
+                    random_seed=options["random_seed"],
+                    progress=self.progress,
+                )
+                self.stdout.write("")
+
+        fixture = Fixture(random.Random(options["random_seed"]))
+        self.check_coverage()
+        report = {
+            "meta": {
+                "created": timezone.now().isoformat(),
+                "revision": git_revision(),
+                "database": connection.vendor,
+                "samples": options["samples"],
+                "users": User.objects.count(),
+                "cards": Card.objects.count(),
+                "styles": CardStyleDeclaration.objects.count(),
+                "follows": FollowRelationship.objects.count(),
+            },
+            "routes": {},
+        }
+        self.stdout.write(
+            "{users} users, {cards} cards, {styles} styles, {follows} follows "
+            "on {database}\n".format(**report["meta"])
+        )
+        self.stdout.write(
+            f"{'route':32} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}"
+        )
+        client = Client(HTTP_AUTHORIZATION=f"Token {fixture.token}")
+        for (method, name), build in ROUTES.items():
+            if options["routes"] and not any(r in name for r in options["routes"]):
+                continue
+            result = self.measure(client, method, build, fixture, options)
+            label = f"{method} {name}"
+            report["routes"][label] = result
+            self.stdout.write(
+                f"{label:32} {result['p50']:9.2f} {result['p95']:9.2f} "
+                f"{result['p99']:9.2f} {result['queries']:8}"
+                + ("" if result["statuses"] == [result["statuses"][0]] else " !")
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"\nReport written to {options['output']}")
+        if options["compare"]:
+            with open(options["compare"]) as baseline:
+                regressions = self.compare(json.load(baseline), report, options)
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"{regressions} routes regressed.")
+
+    def progress(self, stage, done, total):
+        self.stdout.write(f"  {stage}: {done}/{total}", ending="\r")
+
+    def check_coverage(self):
+        benchmarked = {name for _, name in ROUTES}
+        skipped = sorted(set(route_names(api_urls.urlpatterns)) - benchmarked)
+        if skipped:
+            self.stdout.write(f"Not benchmarked: {', '.join(skipped)}\n")
+
+    @override_settings(SERVER_TIMING=True)
+    def measure(self, client, method, build, fixture, options):
+        timings, db_timings, queries, statuses = [], [], [], set()
+        for i in range(options["warmup"] + options["samples"]):
+            path, data = build(fixture)
+            with transaction.atomic():
+                start = time.perf_counter()
+                response = client.generic(
+                    method,
+                    path,
+                    json.dumps(data) if data is not None else "",
+                    content_type="application/json",
+                )
+                if hasattr(response, "streaming_content"):
+                    b"".join(response.streaming_content)
+                elapsed = (time.perf_counter() - start) * 1000
+                transaction.set_rollback(True)
+            if i < options["warmup"]:
+                continue
+            timings.append(elapsed)
+            statuses.add(response.status_code)
+            match = SERVER_TIMING_DB.search(response.get("Server-Timing", ""))
+            if match:
+                db_timings.append(float(match[1]))
+                queries.append(int(match[2]))
+        return {
+            "path": path,
+            "p50": quantile(timings, 50),
+            "p95": quantile(timings, 95),
+            "p99": quantile(timings, 99),
+            "mean": statistics.fmean(timings),
+            "db_p50": quantile(db_timings, 50) if len(db_timings) > 1 else None,
+            "queries": max(queries, default=None),
+            "statuses": sorted(statuses),
+        }
+
+    def compare(self, baseline, report, options):
+        self.stdout.write(
+            f"\nCompared with {options['compare']} "
+            f"({baseline['meta'].get('revision') or 'unknown revision'})"
+        )
+        self.stdout.write(f"{'route':32} {'p50 ms':>19} {'p95 ms':>19} {'queries':>9}")
+        regressions = 0
+        for label, new in report["routes"].items():
+            old = baseline["routes"].get(label)
+            if old is None:
+                self.stdout.write(f"{label:32} (new)")
+                continue
+            change = (new["p50"] - old["p50"]) / old["p50"] * 100 if old["p50"] else 0
+            regressed = change > options["threshold"] or (
+                (new["queries"] or 0) > (old["queries"] or 0)
+            )
+            regressions += regressed
+            self.stdout.write(
+                f"{label:32} {old['p50']:8.2f} → {new['p50']:8.2f} "
+                f"{old['p95']:8.2f} → {new['p95']:8.2f} "
+                f"{old['queries']!s:>3} → {new['queries']!s:<3}"
+                f" {change:+6.1f}%" + ("  REGRESSION" if regressed else "")
+            )
+        return regressions
@@ -0,0 +1,63 @@
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.fastpath import card_rows, serialize_cards
+from api.serializers import CardSerializer
+from api.styles import with_styles
+from api.views import CardViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare CardSerializer with the .values() fast path in api.fastpath "
+        "on pages of published cards from the configured database, queries "
+        "included. Checks the two render the same JSON first. Seed some "
+        "cards with `manage.py seed`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            action="append",
+            dest="page_sizes",
+            help="Cards per page, repeatable; defaults to 10 and 100.",
+        )
+        parser.add_argument("--number", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        queryset = with_styles(CardViewSet.queryset.filter(draft=False))
+        for page_size in options["page_sizes"] or [10, 100]:
+
+            def serializer():
+                return CardSerializer(queryset[:page_size], many=True).data
+
+            def fast_path():
+                return serialize_cards(card_rows(queryset[:page_size]))
+
+            expected = serializer()
+            if not expected:
+                raise CommandError("No cards to serialize; run `manage.py seed`.")
+            if JSONRenderer().render(fast_path()) != JSONRenderer().render(expected):
+                raise CommandError("Fast path output differs from CardSerializer.")
+
+            self.stdout.write(f"\n{len(expected)} cards per page")
+            rates = []
+            for label, function in (
+                ("serializer", serializer),
+                ("fast path", fast_path),
+            ):
+                best = min(
+                    timeit.repeat(
+                        function, number=options["number"], repeat=options["repeat"]
+                    )
+                )
+                rates.append(options["number"] * len(expected) / best)
+                self.stdout.write(
+                    f"  {label:10} {rates[-1]:10,.0f} cards/s "
+                    f"{best / options['number'] * 1000:8.2f} ms/page"
+                )
+            self.stdout.write(f"  speedup    {rates[1] / rates[0]:.1f}x")
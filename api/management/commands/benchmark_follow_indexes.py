@@ -0,0 +1,157 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.models import FollowRelationship, User
+from api.seeding import insert_follows, zipf_weights
+
+USERNAME_PREFIX = "bench-follow-"
+BATCH_SIZE = 10000
+
+
+def followed_page(user_id):
+    # same query as FollowedUsersListView
+    user = User(pk=user_id)
+    return User.objects.followed_by_user(user).with_follow_flags(user)
+
+
+def followers_page(user_id):
+    # same query as FollowersListView
+    user = User(pk=user_id)
+    return User.objects.following_user(user).with_follow_flags(user)
+
+
+QUERIES = {"followed": followed_page, "followers": followers_page}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the /users/followed and /users/followers queries with the follow "
+        "graph indexes, then again with them temporarily replaced by the old "
+        "single-column foreign key indexes (inside a transaction that is rolled "
+        "back). Use --populate to first generate benchmark users and follows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--populate", action="store_true")
+        parser.add_argument("--relationships", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=20_000)
+        parser.add_argument("--samples", type=int, default=200)
+        parser.add_argument("--page-size", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        if options["populate"]:
+            self.populate(rng, options["users"], options["relationships"])
+
+        user_ids = list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX).values_list(
+                "pk", flat=True
+            )
+        )
+        if not user_ids:
+            self.stderr.write("No benchmark users found; run with --populate.")
+            return
+        # popular users are looked up more often, as they would be in production
+        sample = rng.choices(
+            user_ids, cum_weights=zipf_weights(len(user_ids)), k=options["samples"]
+        )
+        self.stdout.write(
+            f"{FollowRelationship.objects.count()} relationships, "
+            f"{len(sample)} sampled users, page size {options['page_size']}"
+        )
+
+        with_indexes = self.time_queries(sample, options["page_size"])
+        with transaction.atomic():
+            self.use_old_indexes()
+            without_indexes = self.time_queries(sample, options["page_size"])
+            transaction.set_rollback(True)
+
+        for name in QUERIES:
+            self.stdout.write(f"\n{name}")
+            for label, timings in (
+                ("old indexes", without_indexes[name]),
+                ("new indexes", with_indexes[name]),
+            ):
+                quantiles = statistics.quantiles(timings, n=100)
+                self.stdout.write(
+                    f"  {label:12} p50 {quantiles[49]:8.3f} ms"
+                    f"  p95 {quantiles[94]:8.3f} ms"
+                )
+            self.stdout.write(
+                "  plan: " + QUERIES[name](sample[0])[: options["page_size"]].explain()
+            )
+
+    def populate(self, rng, user_count, relationship_count):
+        existing = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        User.objects.bulk_create(
+            [
+                User(username=f"{USERNAME_PREFIX}{i}", password="!")
+                for i in range(existing, user_count)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX).values_list(
+                "pk", flat=True
+            )
+        )
+        created = FollowRelationship.objects.filter(
+            follower__username__startswith=USERNAME_PREFIX
+        ).count()
+        weights = zipf_weights(len(user_ids))
+        while created < relationship_count:
+            size = min(BATCH_SIZE, relationship_count - created)
+            # followers are uniform, followed users are power-law distributed
+            batch = set(
+                zip(
+                    rng.choices(user_ids, k=size),
+                    rng.choices(user_ids, cum_weights=weights, k=size),
+                )
+            )
+            rows = [
+                (
+                    follower,
+                    followed,
+                    # roughly one follow in twenty is blocked
+                    (
+                        FollowRelationship.Status.BLOCKED
+                        if rng.random() < 0.05
+                        else FollowRelationship.Status.ACTIVE
+                    ),
+                )
+                for follower, followed in batch
+                if follower != followed
+            ]
+            with transaction.atomic():
+                written = insert_follows(rows)
+            created += written
+            self.stdout.write(f"  {created} relationships written", ending="\r")
+        self.stdout.write("")
+
+    def use_old_indexes(self):
+        quote = connection.ops.quote_name
+        table = quote(FollowRelationship._meta.db_table)
+        with connection.cursor() as cursor:
+            for index in FollowRelationship._meta.indexes:
+                cursor.execute(f"DROP INDEX {quote(index.name)}")
+            for column in ("follower_id", "followed_user_id"):
+                cursor.execute(
+                    f"CREATE INDEX {quote('bench_' + column)} "
+                    f"ON {table} ({quote(column)})"
+                )
+
+    def time_queries(self, user_ids, page_size):
+        timings = {name: [] for name in QUERIES}
+        for user_id in user_ids:
+            for name, query in QUERIES.items():
+                start = time.perf_counter()
+                queryset = query(user_id)
+                queryset.count()
+                list(queryset[:page_size])
+                timings[name].append((time.perf_counter() - start) * 1000)
+        return timings
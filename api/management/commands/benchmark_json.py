@@ -0,0 +1,83 @@
+import io
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer
+from api.serializers import CardSerializer
+from api.styles import with_styles
+from api.views import CardViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare encode and decode throughput of DRF's stdlib JSON renderer "
+        "and parser with the orjson-backed ones in api.renderers and "
+        "api.parsers, on pages of serialized cards (with their styles) from "
+        "the configured database. Seed some first with `manage.py seed`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            action="append",
+            dest="page_sizes",
+            help="Cards per payload, repeatable; defaults to 10 and 100.",
+        )
+        parser.add_argument("--number", type=int, default=200)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        for page_size in options["page_sizes"] or [10, 100]:
+            cards = list(
+                with_styles(CardViewSet.queryset.filter(draft=False))[:page_size]
+            )
+            if not cards:
+                raise CommandError("No cards to serialize; run `manage.py seed`.")
+            # shaped like a page from the card list endpoint
+            data = {
+                "count": len(cards),
+                "next": None,
+                "previous": None,
+                "results": CardSerializer(cards, many=True).data,
+            }
+            body = JSONRenderer().render(data)
+            if FastJSONRenderer().render(data) != body:
+                raise CommandError("FastJSONRenderer output differs from JSONRenderer.")
+
+            self.stdout.write(
+                f"\n{len(cards)} cards, {len(body) / 1024:.1f} KiB per payload"
+            )
+            for action, baseline, fast in (
+                ("encode", JSONRenderer().render, FastJSONRenderer().render),
+                (
+                    "decode",
+                    lambda body: JSONParser().parse(io.BytesIO(body)),
+                    lambda body: FastJSONParser().parse(io.BytesIO(body)),
+                ),
+            ):
+                argument = data if action == "encode" else body
+                rates = [
+                    self.rate(function, argument, options)
+                    for function in (baseline, fast)
+                ]
+                for label, rate in zip(("json", "orjson"), rates):
+                    self.stdout.write(
+                        f"  {action} {label:7} {rate:10,.0f} payloads/s "
+                        f"{rate * len(body) / 2**20:8.1f} MiB/s"
+                    )
+                self.stdout.write(f"  {action} speedup {rates[1] / rates[0]:.1f}x")
+
+    def rate(self, function, argument, options):
+        best = min(
+            timeit.repeat(
+                lambda: function(argument),
+                number=options["number"],
+                repeat=options["repeat"],
+            )
+        )
+        return options["number"] / best
@@ -0,0 +1,190 @@
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from itertools import cycle
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from rest_framework.authtoken.models import Token
+
+from api.models import Card, User
+
+SERVERS = {
+    "sync": {"ASGI_SERVER": "false", "ASYNC_READ_VIEWS": "false"},
+    "asgi": {"ASGI_SERVER": "true", "ASYNC_READ_VIEWS": "true"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the hot read endpoints (card list and detail, feed, "
+        "followers) with concurrent keep-alive clients. With --serve, start "
+        "gunicorn from gunicorn.conf.py as the current sync setup, as uvicorn "
+        "workers with the async views, or both one after the other, against "
+        "this project's database; otherwise test the server at --url."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8765")
+        parser.add_argument("--serve", choices=["sync", "asgi", "both"])
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--duration", type=float, default=10)
+        parser.add_argument(
+            "--user",
+            help="Username to send requests as; defaults to whoever follows the most users.",
+        )
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Path to request, repeatable; defaults to the hot read endpoints.",
+        )
+
+    def handle(self, *args, **options):
+        token = self.token(options["user"])
+        paths = options["paths"] or self.default_paths()
+        self.stdout.write(f"Paths: {', '.join(paths)}")
+
+        if not options["serve"]:
+            self.report(options["url"], self.run(options, token, paths))
+            return
+        servers = ["sync", "asgi"] if options["serve"] == "both" else [options["serve"]]
+        for server in servers:
+            with self.server(server, options):
+                self.report(
+                    f"{server} ({options['workers']} workers)",
+                    self.run(options, token, paths),
+                )
+
+    def token(self, username):
+        users = User.objects.all()
+        user = (
+            users.get(username=username)
+            if username
+            else users.order_by("-following_count").first()
+        )
+        if user is None:
+            raise CommandError("No users to send requests as; run the seed first.")
+        return Token.objects.get_or_create(user=user)[0].key
+
+    def default_paths(self):
+        latest = Card.objects.filter(draft=False).aggregate(pk=Max("pk"))["pk"]
+        paths = ["/api/cards/", "/api/feed/", "/api/users/followers"]
+        if latest is not None:
+            paths.insert(1, f"/api/cards/{latest}/")
+        return paths
+
+    def server(self, name, options):
+        url = urlsplit(options["url"])
+        env = {
+            **os.environ,
+            **SERVERS[name],
+            "DJANGO_SETTINGS_MODULE": os.environ.get(
+                "DJANGO_SETTINGS_MODULE", "cards.settings"
+            ),
+            "WEB_CONCURRENCY": str(options["workers"]),
+        }
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "gunicorn",
+                "--config",
+                str(settings.BASE_DIR / "gunicorn.conf.py"),
+                "--bind",
+                url.netloc,
+                "--log-level",
+                "warning",
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        return RunningServer(process, url.hostname, url.port)
+
+    def run(self, options, token, paths):
+        url = urlsplit(options["url"])
+        headers = {"Authorization": f"Token {token}", "Accept": "application/json"}
+        deadline = time.perf_counter() + options["duration"]
+        latencies, errors = [], []
+
+        def client(offset):
+            connection = http.client.HTTPConnection(url.hostname, url.port)
+            # stagger the paths so every endpoint is busy at once
+            requests = cycle(
+                paths[offset % len(paths) :] + paths[: offset % len(paths)]
+            )
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    connection.request("GET", next(requests), headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        errors.append(response.status)
+                except (OSError, http.client.HTTPException) as error:
+                    errors.append(type(error).__name__)
+                    connection.close()
+                    connection = http.client.HTTPConnection(url.hostname, url.port)
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+            connection.close()
+
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=client, args=(i,))
+            for i in range(options["concurrency"])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, errors, time.perf_counter() - started
+
+    def report(self, label, result):
+        latencies, errors, elapsed = result
+        self.stdout.write(f"\n{label}")
+        if len(latencies) < 2:
+            self.stdout.write(
+                f"  only {len(latencies)} responses, {len(errors)} errors"
+            )
+            return
+        quantiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"  {len(latencies) / elapsed:8.1f} req/s"
+            f"  p50 {quantiles[49]:7.1f} ms  p95 {quantiles[94]:7.1f} ms"
+            f"  p99 {quantiles[98]:7.1f} ms  errors {len(errors)}"
+        )
+
+
+class RunningServer:
+    """Context manager waiting for a server process to accept connections."""
+
+    def __init__(self, process, host, port, timeout=30):
+        self.process, self.host, self.port, self.timeout = process, host, port, timeout
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError("Server exited during startup.")
+            try:
+                connection = http.client.HTTPConnection(self.host, self.port)
+                connection.request("GET", "/api/")
+                connection.getresponse().read()
+                connection.close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.process.terminate()
+        raise CommandError("Server did not start in time.")
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.presets import prune_presets
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete style presets no card uses any more, e.g. after cards "
+        "change their appearance. Safe to run while cards are being written."
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Deleted {prune_presets()} unused presets.")
+        self.stdout.write(self.style.SUCCESS("Style presets pruned."))
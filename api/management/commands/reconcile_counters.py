@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every user's follower, following and card counts from the "
+        "follow and card tables and fix any that have drifted."
+    )
+
+    def handle(self, *args, **options):
+        for field, fixed in reconcile_counters().items():
+            self.stdout.write(f"{field}: corrected {fixed} users")
+        self.stdout.write(self.style.SUCCESS("Counters reconciled."))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from api.suggestions import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_LIMIT,
+    refresh_suggestions,
+    users_affected_since,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the friends-of-friends follow suggestions served at "
+        "/users/suggestions. Users are processed in batches so memory stays "
+        "bounded however large the follow graph is. Pass --since to only "
+        "refresh users affected by follows made after a given time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            help="ISO 8601 datetime; only refresh users affected by newer follows.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="How many users to compute per query and transaction.",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=DEFAULT_LIMIT,
+            help="How many suggestions to keep per user.",
+        )
+
+    def handle(self, *args, **options):
+        users = None
+        if options["since"]:
+            try:
+                since = parse_datetime(options["since"])
+            except ValueError:  # well formatted but not a real datetime
+                since = None
+            if since is None:
+                raise CommandError(f"Invalid --since datetime: {options['since']}")
+            users = users_affected_since(since)
+
+        processed = written = 0
+        for processed, written in refresh_suggestions(
+            users, options["batch_size"], options["limit"]
+        ):
+            self.stdout.write(f"{processed} users processed...")
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {written} suggestions for {processed} users.")
+        )
@@ -0,0 +1,113 @@
+import argparse
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.models import Card, CardStyleDeclaration, FollowRelationship, User
+from api.seeding import BATCH_SIZE, USERNAME_PREFIX, flush, seed
+
+
+def count_range(value):
+    """Parse "N" or "LOW-HIGH" into a (low, high) pair."""
+    low, _, high = value.partition("-")
+    try:
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected N or LOW-HIGH, got {value!r}")
+    if not 0 <= low <= high:
+        raise argparse.ArgumentTypeError(f"invalid range {value!r}")
+    return low, high
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic users, follows, cards and style declarations at "
+        "production scale for benchmarks and load tests, using batched "
+        "bulk inserts (COPY on PostgreSQL). Seeded users are named "
+        f"{USERNAME_PREFIX}N; --flush deletes them and everything of theirs. "
+        "The same options and --random-seed against the same starting data "
+        "give the same dataset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument(
+            "--follows-per-user",
+            type=int,
+            default=20,
+            help="Average follows per user; the total is users × this.",
+        )
+        parser.add_argument(
+            "--follow-exponent",
+            type=float,
+            default=1.0,
+            help="Power-law exponent of follower counts; 0 is uniform, "
+            "higher concentrates followers on fewer users.",
+        )
+        parser.add_argument("--blocked-ratio", type=float, default=0.0)
+        parser.add_argument("--cards-per-user", type=int, default=5)
+        parser.add_argument("--draft-ratio", type=float, default=0.1)
+        parser.add_argument(
+            "--styles-per-card",
+            type=count_range,
+            default=(3, 3),
+            help="Style declarations per card, N or a LOW-HIGH range.",
+        )
+        parser.add_argument("--random-seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--no-copy",
+            dest="copy",
+            action="store_false",
+            help="Use bulk_create on PostgreSQL too.",
+        )
+        parser.add_argument(
+            "--flush",
+            action="store_true",
+            help="Delete existing seeded data first.",
+        )
+
+    def handle(self, *args, **options):
+        if options["flush"]:
+            deleted = flush()
+            self.stdout.write(f"Deleted {deleted} seeded users and their data.")
+
+        self.stage = None
+        started = self.last_progress = time.perf_counter()
+        seed(
+            users=options["users"],
+            follows_per_user=options["follows_per_user"],
+            cards_per_user=options["cards_per_user"],
+            styles_per_card=options["styles_per_card"],
+            follow_exponent=options["follow_exponent"],
+            blocked_ratio=options["blocked_ratio"],
+            draft_ratio=options["draft_ratio"],
+            random_seed=options["random_seed"],
+            batch_size=options["batch_size"],
+            copy=options["copy"],
+            progress=self.progress,
+        )
+        if self.stage:
+            self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded in {time.perf_counter() - started:.1f}s. Now "
+                f"{User.objects.count()} users, {Card.objects.count()} cards, "
+                f"{CardStyleDeclaration.objects.count()} styles and "
+                f"{FollowRelationship.objects.count()} follows on {connection.vendor}."
+            )
+        )
+
+    def progress(self, stage, done, total):
+        now = time.perf_counter()
+        if stage != self.stage:
+            if self.stage:
+                self.stdout.write("")
+            # the previous stage ended at its last report
+            self.stage, self.stage_started = stage, self.last_progress
+        self.last_progress = now
+        rate = done / max(now - self.stage_started, 1e-6)
+        self.stdout.write(
+            f"  {stage}: {done}/{total} ({rate:,.0f} rows/s)", ending="\r"
+        )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Card
+from api.styles import BATCH_SIZE, sync_compact_styles
+
+
+class Command(BaseCommand):
+    help = (
+        "Rewrite every card's compact_styles from its style declarations, "
+        "e.g. after editing declarations outside the API."
+    )
+
+    def handle(self, *args, **options):
+        card_ids = Card.objects.order_by("pk").values_list("pk", flat=True)
+        synced = 0
+        batch = []
+        for card_id in card_ids.iterator(chunk_size=BATCH_SIZE):
+            batch.append(card_id)
+            if len(batch) == BATCH_SIZE:
+                sync_compact_styles(batch)
+                synced += len(batch)
+                batch = []
+        sync_compact_styles(batch)
+        synced += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Synced styles of {synced} cards."))
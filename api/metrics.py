@@ -0,0 +1,254 @@
+"""
+Per-request instrumentation.
+
+RequestMetricsMiddleware counts each request's queries and times its
+database work, serialization, response rendering and total latency. It reports them in a
+Server-Timing header and adds them to per-view totals, which are served in
+Prometheus text format at /api/metrics/.
+
+Queries are recorded by an execute wrapper on every database connection
+(installed from api.signals). The wrapper writes to the current request's
+RequestMetrics through a context variable, so queries run in sync_to_async
+threads under ASGI are counted too. Totals are kept per process: with
+several workers, each scrape sees the worker that answered it.
+
+Serialization is timed where it happens, by timed_serialization() around
+serializer.data (api.serializers) and fast-path row shaping (api.fastpath).
+"""
+
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .caching import cache_stats
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# upper bounds, in seconds, of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self.total = 0.0
+        self.serializing = False
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    @property
+    def app(self):
+        """Time outside the database, serialization and rendering: views, middleware."""
+        return max(self.total - self.db - self.serialize - self.render, 0.0)
+
+    def server_timing(self):
+        return ", ".join(
+            [
+                f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+                f"app;dur={self.app * 1000:.1f}",
+                f"serialize;dur={self.serialize * 1000:.1f}",
+                f"render;dur={self.render * 1000:.1f}",
+                f"total;dur={self.total * 1000:.1f}",
+            ]
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db += time.perf_counter() - started
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Count the enclosed block as the current request's serialization time.
+    Queries it runs (e.g. prefetches) stay under db, and blocks nested in
+    another are not counted twice.
+    """
+    metrics = _current.get()
+    if metrics is None or metrics.serializing:
+        yield
+        return
+    metrics.serializing = True
+    started, db = time.perf_counter(), metrics.db
+    try:
+        yield
+    finally:
+        metrics.serializing = False
+        elapsed = time.perf_counter() - started
+        metrics.serialize += max(elapsed - (metrics.db - db), 0.0)
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsRegistry:
+    """Running per-view totals, safe to update from several threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = defaultdict(int)
+        self.buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self.totals = defaultdict(lambda: defaultdict(float))
+
+    def observe(self, view, method, status, metrics):
+        with self.lock:
+            self.requests[view, method, status] += 1
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if metrics.total <= bound:
+                    self.buckets[view][i] += 1
+            totals = self.totals[view]
+            totals["count"] += 1
+            totals["total"] += metrics.total
+            totals["queries"] += metrics.queries
+            totals["db"] += metrics.db
+            totals["serialize"] += metrics.serialize
+            totals["render"] += metrics.render
+
+    def render(self):
+        """The totals in Prometheus text exposition format."""
+        with self.lock:
+            requests = dict(self.requests)
+            buckets = {view: list(counts) for view, counts in self.buckets.items()}
+            totals = {view: dict(values) for view, values in self.totals.items()}
+
+        lines = [
+            "# HELP cards_http_requests_total Requests handled, by view, method and status.",
+            "# TYPE cards_http_requests_total counter",
+        ]
+        for (view, method, status), count in sorted(requests.items()):
+            lines.append(
+                f'cards_http_requests_total{{view="{view}",method="{method}",'
+                f'status="{status}"}} {count}'
+            )
+
+        lines += [
+            "# HELP cards_http_request_duration_seconds Total request latency, by view.",
+            "# TYPE cards_http_request_duration_seconds histogram",
+        ]
+        for view in sorted(totals):
+            for bound, count in zip(DURATION_BUCKETS, buckets[view]):
+                lines.append(
+                    f'cards_http_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {count}'
+                )
+            count = int(totals[view]["count"])
+            lines += [
+                f'cards_http_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {count}',
+                f'cards_http_request_duration_seconds_sum{{view="{view}"}} {totals[view]["total"]:.6f}',
+                f'cards_http_request_duration_seconds_count{{view="{view}"}} {count}',
+            ]
+
+        for name, key, help_text in (
+            ("cards_db_queries_total", "queries", "Database queries run, by view."),
+            (
+                "cards_db_duration_seconds_total",
+                "db",
+                "Time spent in database queries, by view.",
+            ),
+            (
+                "cards_serialize_duration_seconds_total",
+                "serialize",
+                "Time spent serializing response data, by view.",
+            ),
+            (
+                "cards_render_duration_seconds_total",
+                "render",
+                "Time spent rendering responses, by view.",
+            ),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for view in sorted(totals):
+                value = totals[view][key]
+                value = int(value) if key == "queries" else f"{value:.6f}"
+                lines.append(f'{name}{{view="{view}"}} {value}')
+
+        stats = cache_stats()
+        lines += [
+            "# HELP cards_response_cache_requests_total Anonymous card reads by response cache result.",
+            "# TYPE cards_response_cache_requests_total counter",
+            f'cards_response_cache_requests_total{{result="hit"}} {stats["hits"]}',
+            f'cards_response_cache_requests_total{{result="miss"}} {stats["misses"]}',
+        ]
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure every request (see the module docstring). Sends a Server-Timing
+    header unless SERVER_TIMING is off. Works in both sync and async stacks.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that part
+        metrics = _current.get()
+        if metrics is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                metrics.render += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, metrics):
+        metrics.finish()
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        registry.observe(view, request.method, response.status_code, metrics)
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = metrics.server_timing()
+        return response
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0011_card_back_background_color"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="card",
+            index=models.Index(
+                condition=models.Q(("draft", False)),
+                fields=["-created_at", "-id"],
+                name="card_published_recent_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:16
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX api_card_search_vector_gin ON api_card "
+            "USING gin (search_vector)"
+        )
+        schema_editor.execute(
+            "UPDATE api_card SET search_vector = "
+            "setweight(to_tsvector('english', coalesce(api_card.front_text, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(api_card.back_text, '')), 'B') || "
+            "setweight(to_tsvector('english', api_user.username), 'C') "
+            "FROM api_user WHERE api_user.id = api_card.creator_id"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE api_card_fts "
+            "USING fts5(front_text, back_text, username)"
+        )
+        schema_editor.execute(
+            "INSERT INTO api_card_fts (rowid, front_text, back_text, username) "
+            "SELECT api_card.id, api_card.front_text, coalesce(api_card.back_text, ''), "
+            "api_user.username FROM api_card "
+            "INNER JOIN api_user ON api_user.id = api_card.creator_id"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS api_card_search_vector_gin")
+    elif vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS api_card_fts")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0012_card_published_recent_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="card",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0013_card_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="card",
+            index=models.Index(
+                condition=models.Q(("draft", False)),
+                fields=["creator", "-created_at", "-id"],
+                name="card_published_by_creator_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:22
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    User = apps.get_model("api", "User")
+    Card = apps.get_model("api", "Card")
+    FollowRelationship = apps.get_model("api", "FollowRelationship")
+
+    def count(queryset, group_by):
+        counts = (
+            queryset.filter(**{group_by: OuterRef("pk")})
+            .order_by()
+            .values(group_by)
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        return Coalesce(Subquery(counts), Value(0))
+
+    active = FollowRelationship.objects.filter(status=1)
+    User.objects.update(
+        follower_count=count(active, "followed_user"),
+        following_count=count(active, "follower"),
+        card_count=count(Card.objects.filter(draft=False), "creator"),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0015_feedentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="card_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="follower_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="following_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
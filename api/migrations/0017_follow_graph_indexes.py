@@ -0,0 +1,59 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0016_user_counters"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="followrelationship",
+            index=models.Index(
+                condition=models.Q(("status", 1)),
+                fields=["follower", "-created_at"],
+                include=("followed_user",),
+                name="follow_active_by_follower_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="followrelationship",
+            index=models.Index(
+                condition=models.Q(("status", 1)),
+                fields=["followed_user", "-created_at"],
+                include=("follower",),
+                name="follow_active_by_followed_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="followrelationship",
+            index=models.Index(
+                fields=["followed_user", "status", "-created_at"],
+                name="follow_by_followed_status_idx",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="followrelationship",
+            name="followed_user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="relationship_as_followed_user",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="followrelationship",
+            name="follower",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="relationship_as_follower",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:28
+
+import api.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0017_follow_graph_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name="user",
+            managers=[
+                ("objects", api.models.UserManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,150 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:01
+
+import hashlib
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+APPEARANCE_FIELDS = (
+    "background_color",
+    "back_background_color",
+    "font",
+    "font_size",
+    "text_align",
+)
+NO_APPEARANCE = (None,) * len(APPEARANCE_FIELDS)
+
+
+def card_batches(Card, *fields):
+    batch = []
+    for row in Card.objects.order_by("pk").values_list("pk", *fields).iterator():
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def preset_key(appearance):
+    # same as api.presets.preset_key
+    return hashlib.sha256(
+        json.dumps(list(appearance), separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+def move_appearance(apps, schema_editor):
+    Card = apps.get_model("api", "Card")
+    StylePreset = apps.get_model("api", "StylePreset")
+
+    # same as api.presets.intern_presets, for every card
+    for batch in card_batches(Card, *APPEARANCE_FIELDS):
+        looks = {
+            pk: tuple(values) for pk, *values in batch if tuple(values) != NO_APPEARANCE
+        }
+        keys = {preset_key(appearance): appearance for appearance in looks.values()}
+        ids = dict(StylePreset.objects.filter(key__in=keys).values_list("key", "pk"))
+        StylePreset.objects.bulk_create(
+            [
+                StylePreset(key=key, **dict(zip(APPEARANCE_FIELDS, appearance)))
+                for key, appearance in keys.items()
+                if key not in ids
+            ]
+        )
+        ids.update(StylePreset.objects.filter(key__in=keys).values_list("key", "pk"))
+        Card.objects.bulk_update(
+            [
+                Card(pk=pk, preset_id=ids[preset_key(appearance)])
+                for pk, appearance in looks.items()
+            ],
+            ["preset"],
+        )
+
+
+def restore_appearance(apps, schema_editor):
+    Card = apps.get_model("api", "Card")
+
+    for batch in card_batches(Card, *[f"preset__{f}" for f in APPEARANCE_FIELDS]):
+        Card.objects.bulk_update(
+            [
+                Card(pk=pk, **dict(zip(APPEARANCE_FIELDS, values)))
+                for pk, *values in batch
+            ],
+            APPEARANCE_FIELDS,
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0019_follow_suggestions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StylePreset",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=64, unique=True)),
+                (
+                    "background_color",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                (
+                    "back_background_color",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                ("font", models.CharField(blank=True, max_length=255, null=True)),
+                (
+                    "font_size",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                (
+                    "text_align",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="card",
+            name="preset",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="cards",
+                to="api.stylepreset",
+            ),
+        ),
+        migrations.RunPython(move_appearance, restore_appearance),
+        migrations.RemoveField(
+            model_name="card",
+            name="background_color",
+        ),
+        migrations.RemoveField(
+            model_name="card",
+            name="back_background_color",
+        ),
+        migrations.RemoveField(
+            model_name="card",
+            name="font",
+        ),
+        migrations.RemoveField(
+            model_name="card",
+            name="font_size",
+        ),
+        migrations.RemoveField(
+            model_name="card",
+            name="text_align",
+        ),
+    ]
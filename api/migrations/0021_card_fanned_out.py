@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0020_style_presets"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="card",
+            name="fanned_out",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
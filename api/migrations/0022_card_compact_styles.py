@@ -0,0 +1,56 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:39
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def populate_compact_styles(apps, schema_editor):
+    Card = apps.get_model("api", "Card")
+    CardStyleDeclaration = apps.get_model("api", "CardStyleDeclaration")
+
+    card_ids = (
+        CardStyleDeclaration.objects.order_by("card_id")
+        .values_list("card_id", flat=True)
+        .distinct()
+        .iterator()
+    )
+    batch = []
+    for card_id in card_ids:
+        batch.append(card_id)
+        if len(batch) == BATCH_SIZE:
+            copy_styles(Card, CardStyleDeclaration, batch)
+            batch = []
+    copy_styles(Card, CardStyleDeclaration, batch)
+
+
+def copy_styles(Card, CardStyleDeclaration, card_ids):
+    # same layout as api.styles.sync_compact_styles
+    styles = defaultdict(list)
+    for card_id, *triple in (
+        CardStyleDeclaration.objects.filter(card_id__in=card_ids)
+        .order_by("card_id", "property")
+        .values_list("card_id", "property", "value", "boolValue")
+    ):
+        styles[card_id].append(triple)
+    Card.objects.bulk_update(
+        [Card(pk=pk, compact_styles=styles[pk]) for pk in card_ids],
+        ["compact_styles"],
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0021_card_fanned_out"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="card",
+            name="compact_styles",
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.RunPython(populate_compact_styles, migrations.RunPython.noop),
+    ]
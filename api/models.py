@@ -1,5 +1,75 @@
-from django.db import models
+from django.db import models, transaction
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as AuthUserManager
+
+
+class UserQuerySet(models.QuerySet):
+    def followed_by_user(self, user):
+        """Users that `user` actively follows, most recently followed first."""
+        return (
+            self.filter(
+                relationship_as_followed_user__follower=user,
+                relationship_as_followed_user__status=FollowRelationship.Status.ACTIVE,
+            )
+            .annotate(
+                relationship_created=models.F(
+                    "relationship_as_followed_user__created_at"
+                )
+            )
+            .order_by("-relationship_created")
+        )
+
+    def following_user(self, user):
+        """Users who actively follow `user`, most recent followers first."""
+        return (
+            self.filter(
+                relationship_as_follower__followed_user=user,
+                relationship_as_follower__status=FollowRelationship.Status.ACTIVE,
+            )
+            .annotate(
+                relationship_created=models.F("relationship_as_follower__created_at")
+            )
+            .order_by("-relationship_created")
+        )
+
+    def mutuals_of(self, user):
+        """Users who `user` follows and who follow `user` back, both actively."""
+        return self.filter(
+            models.Exists(
+                FollowRelationship.objects.active().filter(
+                    follower=user, followed_user=models.OuterRef("pk")
+                )
+            ),
+            models.Exists(
+                FollowRelationship.objects.active().filter(
+                    follower=models.OuterRef("pk"), followed_user=user
+                )
+            ),
+        )
+
+    def with_follow_flags(self, user):
+        """
+        Annotate each user with `followed_by_me` (user actively follows them)
+        and `follows_me` (they actively follow user), as correlated EXISTS
+        subqueries rather than a lookup per row.
+        """
+        return self.annotate(
+            followed_by_me=models.Exists(
+                FollowRelationship.objects.active().filter(
+                    follower=user, followed_user=models.OuterRef("pk")
+                )
+            ),
+            follows_me=models.Exists(
+                FollowRelationship.objects.active().filter(
+                    follower=models.OuterRef("pk"), followed_user=user
+                )
+            ),
+        )
+
+
+class UserManager(AuthUserManager.from_queryset(UserQuerySet)):
+    pass
 
 
 class User(AbstractUser):
@@ -9,28 +79,56 @@ class User(AbstractUser):
         related_name="followed_by",
         symmetrical=False,
     )
+    # Denormalized counts of active follow relationships and published cards,
+    # kept up to date by api.counters. Repair drift with `manage.py reconcile_counters`.
+    follower_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+    card_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = UserManager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored username so saves can tell when it changes
+        instance._loaded_username = instance.__dict__.get("username")
+        return instance
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_username = self.username
+
+    @property
+    def username_changed(self):
+        """True if saving now renames the user (not when creating one)."""
+        loaded = getattr(self, "_loaded_username", None)
+        return loaded is not None and self.username != loaded
+
+    @transaction.atomic
     def follow_another_user(self, other_user):
         relationship, created = FollowRelationship.objects.get_or_create(
             follower=self, followed_user=other_user
         )
         return relationship
 
+    @transaction.atomic
     def unfollow_another_user(self, other_user):
         FollowRelationship.objects.filter(
             follower=self, followed_user=other_user
         ).delete()
 
+    @transaction.atomic
     def block_follower(self, other_user):
-        relationship = FollowRelationship.objects.get(
+        relationship = FollowRelationship.objects.select_for_update().get(
             follower=other_user, followed_user=self
         )
         relationship.status = FollowRelationship.Status.BLOCKED
         relationship.save()
         return relationship
 
+    @transaction.atomic
     def unblock_follower(self, other_user):
-        relationship = FollowRelationship.objects.get(
+        relationship = FollowRelationship.objects.select_for_update().get(
             follower=other_user, followed_user=self
         )
         relationship.status = FollowRelationship.Status.ACTIVE
@@ -38,16 +136,42 @@ class User(AbstractUser):
         return relationship
 
     def get_relationships_where_follower(self):
-        return self.ACTIVE.filter(status=FollowRelationship.Status.ACTIVE)
+        return self.relationship_as_follower.active()
 
     def get_relationships_where_followed(self):
-        return self.followers.filter(status=FollowRelationship.Status.ACTIVE)
+        return self.relationship_as_followed_user.active()
 
     def get_users_blocking_me(self):
-        return self.ACTIVE.filter(status=FollowRelationship.Status.BLOCKED)
+        return User.objects.filter(
+            relationship_as_followed_user__follower=self,
+            relationship_as_followed_user__status=FollowRelationship.Status.BLOCKED,
+        )
 
     def get_blocked_followers(self):
-        return self.followers.filter(status=FollowRelationship.Status.BLOCKED)
+        return User.objects.filter(
+            relationship_as_follower__followed_user=self,
+            relationship_as_follower__status=FollowRelationship.Status.BLOCKED,
+        )
+
+    def get_mutuals(self):
+        return User.objects.mutuals_of(self)
+
+    def follows(self, other_user):
+        return (
+            FollowRelationship.objects.active()
+            .between(follower=self, followed_user=other_user)
+            .exists()
+        )
+
+    def is_followed_by(self, other_user):
+        return other_user.follows(self)
+
+    def is_blocked_by(self, other_user):
+        return (
+            FollowRelationship.objects.blocked()
+            .between(follower=self, followed_user=other_user)
+            .exists()
+        )
 
 
 class BaseModel(models.Model):
@@ -63,18 +187,68 @@ class Card(BaseModel):
     front_text = models.CharField(max_length=255)
     back_text = models.CharField(max_length=255, null=True, blank=True)
     imageURL = models.URLField(max_length=200, null=True, blank=True)
-    background_color = models.CharField(max_length=255, null=True, blank=True)
-    back_background_color = models.CharField(max_length=255, null=True, blank=True)
-    font = models.CharField(max_length=255, null=True, blank=True)
-    font_size = models.CharField(max_length=255, null=True, blank=True)
-    text_align = models.CharField(max_length=255, null=True, blank=True)
     draft = models.BooleanField(
         default=False
     )  # false because front end may not implement draft feature
+    # whether publishing pushed the card into followers' FeedEntry rows, set
+    # by api.feed in "hybrid" mode; cards that weren't are pulled at read time
+    fanned_out = models.BooleanField(default=False, editable=False)
+    # maintained by api.search; only populated on Postgres
+    search_vector = SearchVectorField(null=True, editable=False)
+    # copy of the styles as [property, value, boolValue] triples sorted by
+    # property, maintained by api.styles and read instead of the rows in
+    # "compact" storage mode
+    compact_styles = models.JSONField(default=list, editable=False)
+    # the card's appearance (colors, font, alignment), shared with every
+    # card that looks the same; maintained by api.presets. Null when none
+    # of it is set
+    preset = models.ForeignKey(
+        "StylePreset",
+        on_delete=models.PROTECT,
+        related_name="cards",
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored draft flag so saves can tell when a card is published
+        instance._loaded_draft = instance.__dict__.get("draft")
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_draft = self.draft
+
+    @property
+    def was_published(self):
+        """True if saving now publishes the card (created live or taken out of draft)."""
+        return not self.draft and getattr(self, "_loaded_draft", True) is not False
+
+    @property
+    def was_unpublished(self):
+        """True if saving now moves a published card back to draft."""
+        return self.draft and getattr(self, "_loaded_draft", None) is False
 
     def __str__(self):
         return f"Card: {self.front_text}"
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(draft=False),
+                name="card_published_recent_idx",
+            ),
+            models.Index(
+                fields=["creator", "-created_at", "-id"],
+                condition=models.Q(draft=False),
+                name="card_published_by_creator_idx",
+            ),
+        ]
+
 
 class CardStyleDeclaration(models.Model):
     card = models.ForeignKey(Card, on_delete=models.CASCADE, related_name="styles")
@@ -100,20 +274,74 @@ class CardStyleDeclaration(models.Model):
         return f"Card {self.card.pk} style - {self.property}: {self.value}"
 
 
+class StylePreset(models.Model):
+    """
+    A card's appearance fields, shared by every card with exactly the same
+    values. Presets are interned by `key`, a hash of the values, and never
+    change.
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    background_color = models.CharField(max_length=255, null=True, blank=True)
+    back_background_color = models.CharField(max_length=255, null=True, blank=True)
+    font = models.CharField(max_length=255, null=True, blank=True)
+    font_size = models.CharField(max_length=255, null=True, blank=True)
+    text_align = models.CharField(max_length=255, null=True, blank=True)
+
+    def __str__(self):
+        return f"Style preset {self.pk}"
+
+
+class FollowRelationshipQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(status=FollowRelationship.Status.ACTIVE)
+
+    def blocked(self):
+        return self.filter(status=FollowRelationship.Status.BLOCKED)
+
+    def between(self, follower, followed_user):
+        return self.filter(follower=follower, followed_user=followed_user)
+
+
 class FollowRelationship(models.Model):
     class Status(models.IntegerChoices):
         ACTIVE = (1, "Active")
         BLOCKED = (0, "Blocked")
 
+    # no single-column indexes: unique_follows leads with follower and
+    # follow_by_followed_status_idx leads with followed_user
     follower = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name="relationship_as_follower"
+        User,
+        on_delete=models.CASCADE,
+        related_name="relationship_as_follower",
+        db_index=False,
     )
     followed_user = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name="relationship_as_followed_user"
+        User,
+        on_delete=models.CASCADE,
+        related_name="relationship_as_followed_user",
+        db_index=False,
     )
     status = models.IntegerField(choices=Status.choices, default=Status.ACTIVE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = FollowRelationshipQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored status so saves can tell what changed
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_status = self.status
+
+    @property
+    def status_changed(self):
+        return self.status != getattr(self, "_loaded_status", None)
+
     def __str__(self):
         return f"{self.follower.username} follows {self.followed_user.username}"
 
@@ -123,3 +351,77 @@ class FollowRelationship(models.Model):
                 fields=["follower", "followed_user"], name="unique_follows"
             )
         ]
+        indexes = [
+            # /users/followed and the feed: who a user actively follows, newest first
+            models.Index(
+                fields=["follower", "-created_at"],
+                include=["followed_user"],
+                condition=models.Q(status=1),  # Status.ACTIVE
+                name="follow_active_by_follower_idx",
+            ),
+            # /users/followers: who actively follows a user, newest first
+            models.Index(
+                fields=["followed_user", "-created_at"],
+                include=["follower"],
+                condition=models.Q(status=1),  # Status.ACTIVE
+                name="follow_active_by_followed_idx",
+            ),
+            # blocked followers and any other status lookups by followed user
+            models.Index(
+                fields=["followed_user", "status", "-created_at"],
+                name="follow_by_followed_status_idx",
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    """
+    A card delivered to a follower's materialized feed. Only written when
+    FEED_MODE is "hybrid"; see api.feed.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="feed_entries"
+    )
+    card = models.ForeignKey(
+        Card, on_delete=models.CASCADE, related_name="feed_entries"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Card {self.card_id} in {self.user_id}'s feed"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "card"], name="unique_feed_entries")
+        ]
+
+
+class FollowSuggestion(models.Model):
+    """
+    A precomputed "people you may know" entry: `suggested_user` is followed
+    by `score` of the users `user` follows. Rebuilt by the
+    refresh_suggestions command; see api.suggestions.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="follow_suggestions"
+    )
+    suggested_user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="suggested_to"
+    )
+    score = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Suggest {self.suggested_user_id} to {self.user_id} ({self.score})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "suggested_user"], name="unique_follow_suggestions"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["user", "-score"], name="suggestion_by_score_idx"),
+        ]
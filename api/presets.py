@@ -0,0 +1,131 @@
+"""
+Style presets: the card-level appearance fields, shared between cards.
+
+Most cards reuse a handful of color, font and alignment combinations, so
+rather than five free-text columns on every card, a StylePreset holds them
+once and cards point at it (Card.preset). Presets are interned:
+appearance_preset finds or creates the one for a set of values when
+CardSerializer writes them, so cards that look the same share it, and
+presets never change. Cards with none of the fields set have no preset.
+Card reads join it in (see api.styles.with_styles).
+
+Style declarations aren't part of presets: the styles endpoints address
+them row by row, so they stay CardStyleDeclaration rows, with a per-card
+copy for reads in Card.compact_styles (see api.styles).
+
+Changing a card's appearance can leave its old preset unused; run
+`manage.py prune_style_presets` now and then to delete those. That is safe
+while cards are being written on PostgreSQL: interning key-share locks the
+presets it hands out until the write commits, and a prune that races a
+write gives up on that batch instead of deleting a preset in use.
+"""
+
+import hashlib
+import json
+
+from django.db import IntegrityError, connection, transaction
+
+from .models import Card, StylePreset
+
+BATCH_SIZE = 1000
+APPEARANCE_FIELDS = (
+    "background_color",
+    "back_background_color",
+    "font",
+    "font_size",
+    "text_align",
+)
+NO_APPEARANCE = (None,) * len(APPEARANCE_FIELDS)
+PRESET_APPEARANCE = [f"preset__{field}" for field in APPEARANCE_FIELDS]
+
+
+def preset_key(appearance):
+    return hashlib.sha256(
+        json.dumps(list(appearance), separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+def _preset_ids(keys):
+    """
+    {key: id} of the existing presets among `keys`. On PostgreSQL the rows
+    are locked FOR KEY SHARE, which blocks deleting them (see prune_presets)
+    but not other writers reading them.
+    """
+    presets = StylePreset.objects.filter(key__in=keys).values_list("key", "pk")
+    if connection.vendor != "postgresql":
+        return dict(presets)
+    sql, params = presets.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"{sql} FOR KEY SHARE", params)
+        return dict(cursor.fetchall())
+
+
+def intern_presets(appearances):
+    """
+    The preset id for each tuple of APPEARANCE_FIELDS values, creating
+    presets that don't exist yet, or None for a card with none set. Call it
+    in the transaction that points cards at them.
+    """
+    keys = {
+        preset_key(appearance): appearance
+        for appearance in appearances
+        if appearance != NO_APPEARANCE
+    }
+    ids = _preset_ids(keys)
+    missing = [key for key in keys if key not in ids]
+    if missing:
+        # ignore_conflicts as a concurrent write may create the same presets
+        StylePreset.objects.bulk_create(
+            [
+                StylePreset(key=key, **dict(zip(APPEARANCE_FIELDS, keys[key])))
+                for key in missing
+            ],
+            ignore_conflicts=True,
+        )
+        ids.update(_preset_ids(missing))
+    return [
+        None if appearance == NO_APPEARANCE else ids[preset_key(appearance)]
+        for appearance in appearances
+    ]
+
+
+def appearance_preset(card_id, changes):
+    """
+    The preset id for a card with `changes` ({field: value} for some
+    APPEARANCE_FIELDS) applied over its current appearance. card_id is None
+    for a new card. Locks the card's row so concurrent changes to different
+    fields don't undo each other, so call it in a transaction.
+    """
+    appearance = NO_APPEARANCE
+    if card_id is not None:
+        appearance = (
+            Card.objects.select_for_update(of=("self",))
+            .filter(pk=card_id)
+            .values_list(*PRESET_APPEARANCE)
+            .get()
+        )
+    appearance = tuple(
+        changes.get(field, value) for field, value in zip(APPEARANCE_FIELDS, appearance)
+    )
+    return intern_presets([appearance])[0]
+
+
+def prune_presets():
+    """
+    Delete presets no card references any more, returning how many. A batch
+    that a write starts using meanwhile fails its foreign key check and is
+    left for next time.
+    """
+    unused = list(StylePreset.objects.filter(cards=None).values_list("pk", flat=True))
+    deleted = 0
+    for start in range(0, len(unused), BATCH_SIZE):
+        batch = unused[start : start + BATCH_SIZE]
+        try:
+            with transaction.atomic():
+                count, _ = StylePreset.objects.filter(pk__in=batch, cards=None).delete()
+                # foreign keys are checked at commit; check them here instead
+                connection.check_constraints(table_names=[Card._meta.db_table])
+        except IntegrityError:
+            continue
+        deleted += count
+    return deleted
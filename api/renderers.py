@@ -0,0 +1,40 @@
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+# DRF's encoder hook: lazy strings, datetimes ("Z" for UTC), decimals as floats...
+encoder_default = encoders.JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with orjson, several times faster than the json
+    module on serialized card pages. Output is byte for byte what DRF
+    renders: datetimes, decimals and lazy strings go through DRF's encoder
+    hook, and \\u2028/\\u2029 are escaped. Indented output (e.g. for the
+    browsable API), non-default UNICODE_JSON/COMPACT_JSON settings, values
+    orjson can't encode such as integers over 64 bits, and a missing orjson
+    all fall back to JSONRenderer.
+    """
+
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            rendered = orjson.dumps(data, default=encoder_default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return rendered.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
@@ -0,0 +1,146 @@
+import re
+from itertools import islice
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from .models import Card, User
+
+SEARCH_CONFIG = "english"
+SQLITE_FTS_TABLE = "api_card_fts"
+BATCH_SIZE = 1000
+
+
+def card_search_vector(username):
+    return (
+        SearchVector("front_text", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("back_text", weight="B", config=SEARCH_CONFIG)
+        + SearchVector(Value(username), weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def index_card(card):
+    """
+    Refresh the search index entry for a card. Postgres keeps a tsvector on
+    the card row; SQLite keeps a row in an FTS5 table keyed on the card id.
+    """
+    if connection.vendor == "postgresql":
+        Card.objects.filter(pk=card.pk).update(
+            search_vector=card_search_vector(card.creator.username)
+        )
+    elif connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = %s", [card.pk]
+            )
+            cursor.execute(
+                f"INSERT INTO {SQLITE_FTS_TABLE} (rowid, front_text, back_text, username) "
+                "VALUES (%s, %s, %s, %s)",
+                [card.pk, card.front_text, card.back_text or "", card.creator.username],
+            )
+
+
+def index_cards(card_ids):
+    """
+    Refresh the search index for many cards at once, e.g. after bulk_create,
+    BATCH_SIZE cards per statement.
+    """
+    card_ids = iter(card_ids)
+    while batch := list(islice(card_ids, BATCH_SIZE)):
+        _index_batch(batch)
+
+
+def _index_batch(card_ids):
+    if connection.vendor == "postgresql":
+        username = Subquery(
+            User.objects.filter(pk=OuterRef("creator_id")).values("username")
+        )
+        Card.objects.filter(pk__in=card_ids).update(
+            search_vector=SearchVector("front_text", weight="A", config=SEARCH_CONFIG)
+            + SearchVector("back_text", weight="B", config=SEARCH_CONFIG)
+            + SearchVector(username, weight="C", config=SEARCH_CONFIG)
+        )
+    elif connection.vendor == "sqlite":
+        placeholders = ", ".join(["%s"] * len(card_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid IN ({placeholders})",
+                card_ids,
+            )
+            cursor.execute(
+                f"INSERT INTO {SQLITE_FTS_TABLE} (rowid, front_text, back_text, username) "
+                "SELECT api_card.id, api_card.front_text, coalesce(api_card.back_text, ''), "
+                "api_user.username FROM api_card "
+                "INNER JOIN api_user ON api_user.id = api_card.creator_id "
+                f"WHERE api_card.id IN ({placeholders})",
+                card_ids,
+            )
+
+
+def unindex_card(card_pk):
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = %s", [card_pk]
+            )
+
+
+def unindex_cards(cards):
+    """Drop a queryset of cards from the search index, e.g. before a raw delete."""
+    if connection.vendor == "sqlite":
+        sql, params = cards.values("pk").query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid IN ({sql})", params
+            )
+
+
+def search_tokens(terms):
+    return [token for term in terms for token in re.findall(r"\w+", term)]
+
+
+class CardSearchFilter(filters.SearchFilter):
+    """
+    Ranked full-text search over front text, back text and creator username.
+    Every word in ?search= must match the start of a word on the card.
+    Backends without a search index fall back to SearchFilter's LIKE lookups.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        tokens = search_tokens(self.get_search_terms(request))
+        if connection.vendor == "postgresql":
+            if not tokens:
+                return queryset
+            query = SearchQuery(
+                " & ".join(f"{token}:*" for token in tokens),
+                search_type="raw",
+                config=SEARCH_CONFIG,
+            )
+            queryset = queryset.filter(search_vector=query).annotate(
+                search_rank=SearchRank(F("search_vector"), query)
+            )
+        elif connection.vendor == "sqlite":
+            if not tokens:
+                return queryset
+            match = " ".join('"{}"*'.format(token) for token in tokens)
+            queryset = queryset.filter(
+                pk__in=RawSQL(
+                    f"SELECT rowid FROM {SQLITE_FTS_TABLE} "
+                    f"WHERE {SQLITE_FTS_TABLE} MATCH %s",
+                    [match],
+                )
+            ).annotate(
+                # FTS5's bm25 rank is lower for better matches
+                search_rank=RawSQL(
+                    f"SELECT -rank FROM {SQLITE_FTS_TABLE} "
+                    f"WHERE {SQLITE_FTS_TABLE} MATCH %s "
+                    f"AND rowid = {Card._meta.db_table}.id",
+                    [match],
+                )
+            )
+        else:
+            return super().filter_queryset(request, queryset, view)
+        return queryset.order_by("-search_rank", *queryset.query.order_by)
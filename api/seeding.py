@@ -0,0 +1,406 @@
+"""
+Synthetic data for benchmarks and load tests.
+
+Users, a follow graph with power-law follower counts, cards and style
+declarations are written with bulk_create in batched transactions, so
+signals don't fire. On PostgreSQL, follows and styles, the two largest
+tables, are loaded with COPY instead. Search indexing and the denormalized
+counters are brought up to date at the end. Everything is drawn from a
+seeded random generator, so the same arguments against the same starting
+data always produce the same data. Seeded users are named with
+USERNAME_PREFIX so benchmarks can find them again, and flush() removes them.
+"""
+
+import io
+import itertools
+import random
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import Q
+from rest_framework.authtoken.models import Token
+
+from .counters import reconcile_counters
+from .models import (
+    Card,
+    CardStyleDeclaration,
+    FeedEntry,
+    FollowRelationship,
+    FollowSuggestion,
+    User,
+)
+from .search import index_cards, unindex_cards
+from .presets import intern_presets, prune_presets
+from .styles import sync_compact_styles
+
+USERNAME_PREFIX = "seed-"
+BATCH_SIZE = 5000
+
+WORDS = (
+    "happy birthday congratulations thank you get well soon best wishes "
+    "welcome home good luck miss you love always cheers friend family "
+    "celebrate holiday season warm regards hello again"
+).split()
+COLORS = ["#ffffff", "#f8e1e7", "#e1f0f8", "#fdf6d8", "#e3f8e1", "#222222"]
+STYLE_VALUES = {
+    "color": COLORS,
+    "font-family": ["serif", "sans-serif", "cursive", "monospace"],
+    "font-size": ["12px", "16px", "24px", "32px"],
+    "text-align": ["left", "center", "right"],
+    "border-style": ["none", "solid", "dashed", "dotted"],
+    "letter-spacing": ["normal", "1px", "2px"],
+    "line-height": ["1", "1.2", "1.5", "2"],
+    "font-weight": ["normal", "bold"],
+}
+BOOLEAN_STYLES = ["italic", "underline", "shadow", "uppercase"]
+
+
+def zipf_weights(n, exponent=1.0):
+    """Cumulative weights giving the i-th item a share proportional to 1 / i**exponent."""
+    return list(itertools.accumulate(1 / rank**exponent for rank in range(1, n + 1)))
+
+
+def batched(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def seeded_users():
+    return User.objects.filter(username__startswith=USERNAME_PREFIX)
+
+
+def seeded_user_ids():
+    return list(seeded_users().order_by("pk").values_list("pk", flat=True))
+
+
+def use_copy(copy=True):
+    return copy and connection.vendor == "postgresql"
+
+
+def copy_value(value):
+    """A value in COPY's text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_rows(table, columns, rows):
+    """Load rows into a PostgreSQL table with COPY ... FROM STDIN."""
+    data = io.StringIO()
+    for row in rows:
+        data.write("\t".join(map(copy_value, row)) + "\n")
+    data.seek(0)
+    quote = connection.ops.quote_name
+    sql = f"COPY {quote(table)} ({', '.join(map(quote, columns))}) FROM STDIN"
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, "copy_expert"):  # psycopg2
+            raw.copy_expert(sql, data)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(data.getvalue())
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def create_users(count, progress=None, batch_size=BATCH_SIZE):
+    """Create seeded users up to `count` in total; returns all their ids."""
+    existing = seeded_users().count()
+    names = (f"{USERNAME_PREFIX}{i}" for i in range(existing, count))
+    created = existing
+    for batch in batched(names, batch_size):
+        with transaction.atomic():
+            User.objects.bulk_create(
+                [User(username=name, password="!") for name in batch]
+            )
+        created += len(batch)
+        if progress:
+            progress("users", created, count)
+    return seeded_user_ids()
+
+
+def insert_follows(rows, copy=True):
+    """
+    Insert (follower, followed user, status) rows, skipping pairs that already
+    exist. Returns how many were written.
+    """
+    if not use_copy(copy):
+        return len(
+            FollowRelationship.objects.bulk_create(
+                [
+                    FollowRelationship(
+                        follower_id=follower, followed_user_id=followed, status=status
+                    )
+                    for follower, followed, status in rows
+                ],
+                ignore_conflicts=True,
+            )
+        )
+    # COPY can't skip duplicates, so stage the rows and insert from there
+    table = FollowRelationship._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMPORARY TABLE seed_follows "
+            "(follower_id bigint, followed_user_id bigint, status integer) "
+            "ON COMMIT DROP"
+        )
+        copy_rows("seed_follows", ["follower_id", "followed_user_id", "status"], rows)
+        cursor.execute(
+            f"INSERT INTO {table} (follower_id, followed_user_id, status, created_at) "
+            "SELECT follower_id, followed_user_id, status, now() FROM seed_follows "
+            "ON CONFLICT DO NOTHING"
+        )
+        return cursor.rowcount
+
+
+def create_follows(
+    rng,
+    user_ids,
+    count,
+    exponent=1.0,
+    blocked_ratio=0.0,
+    progress=None,
+    batch_size=BATCH_SIZE,
+    copy=True,
+):
+    """
+    Add up to `count` follow relationships between the given users. Followers
+    are picked uniformly and followed users from a power law, so a few users
+    have most of the followers. Duplicate and self follows are skipped rather
+    than redrawn. About `blocked_ratio` of them are blocked.
+    """
+    weights = zipf_weights(len(user_ids), exponent)
+    # shuffle so popularity isn't tied to signup order
+    ranked = rng.sample(user_ids, len(user_ids))
+    created = 0
+    while created < count:
+        size = min(batch_size, count - created)
+        pairs = set(
+            zip(
+                rng.choices(user_ids, k=size),
+                rng.choices(ranked, cum_weights=weights, k=size),
+            )
+        )
+        rows = [
+            (
+                follower,
+                followed,
+                (
+                    FollowRelationship.Status.BLOCKED
+                    if blocked_ratio and rng.random() < blocked_ratio
+                    else FollowRelationship.Status.ACTIVE
+                ),
+            )
+            for follower, followed in sorted(pairs)
+            if follower != followed
+        ]
+        with transaction.atomic():
+            written = insert_follows(rows, copy)
+        if not written:
+            break  # every pair drawn already exists; the graph is saturated
+        created += written
+        if progress:
+            progress("follows", created, count)
+
+
+def create_cards(
+    rng, user_ids, count, draft_ratio=0.1, progress=None, batch_size=BATCH_SIZE
+):
+    """Add `count` cards from the given users, popular users posting more."""
+    weights = zipf_weights(len(user_ids), 0.5)
+    created = 0
+    card_ids = []
+    for batch in batched(range(count), batch_size):
+        cards, looks = [], []
+        for _ in batch:
+            cards.append(
+                Card(
+                    creator_id=rng.choices(user_ids, cum_weights=weights)[0],
+                    front_text=sentence(rng, rng.randint(2, 6)),
+                    back_text=sentence(rng, rng.randint(5, 20)),
+                )
+            )
+            # APPEARANCE_FIELDS, stored on the card's preset
+            appearance = (
+                rng.choice(COLORS),
+                rng.choice(COLORS),
+                rng.choice(STYLE_VALUES["font-family"]),
+                rng.choice(STYLE_VALUES["font-size"]),
+                rng.choice(STYLE_VALUES["text-align"]),
+            )
+            looks.append(appearance)
+            cards[-1].draft = rng.random() < draft_ratio
+        with transaction.atomic():
+            for card, preset_id in zip(cards, intern_presets(looks)):
+                card.preset_id = preset_id
+            cards = Card.objects.bulk_create(cards)
+            ids = [card.pk for card in cards]
+            if None in ids:  # backends that don't return ids from bulk inserts
+                ids = list(
+                    Card.objects.order_by("-pk").values_list("pk", flat=True)[
+                        : len(cards)
+                    ]
+                )
+            index_cards(ids)
+        card_ids.extend(ids)
+        created += len(batch)
+        if progress:
+            progress("cards", created, count)
+    return card_ids
+
+
+def create_styles(
+    rng, card_ids, per_card, progress=None, batch_size=BATCH_SIZE, copy=True
+):
+    """
+    Give each card distinct style declarations: `per_card` of them, or a
+    uniformly drawn number in a (low, high) range. Capped at the number of
+    style properties.
+    """
+    properties = list(STYLE_VALUES) + BOOLEAN_STYLES
+    low, high = per_card if isinstance(per_card, tuple) else (per_card, per_card)
+    counts = [min(rng.randint(low, high), len(properties)) for _ in card_ids]
+    created = 0
+    total = sum(counts)
+    batch_cards = max(batch_size // max(high, 1), 1)
+    for batch in batched(zip(card_ids, counts), batch_cards):
+        rows = []
+        for card_id, count in batch:
+            for prop in rng.sample(properties, count):
+                if prop in STYLE_VALUES:
+                    value, bool_value = rng.choice(STYLE_VALUES[prop]), None
+                else:
+                    value, bool_value = None, rng.random() < 0.5
+                rows.append((card_id, prop, value, bool_value))
+        with transaction.atomic():
+            if use_copy(copy):
+                copy_rows(
+                    CardStyleDeclaration._meta.db_table,
+                    ["card_id", "property", "value", "boolValue"],
+                    rows,
+                )
+            else:
+                CardStyleDeclaration.objects.bulk_create(
+                    [
+                        CardStyleDeclaration(
+                            card_id=card_id,
+                            property=prop,
+                            value=value,
+                            boolValue=bool_value,
+                        )
+                        for card_id, prop, value, bool_value in rows
+                    ]
+                )
+            sync_compact_styles(card_id for card_id, _ in batch)
+        created += len(rows)
+        if progress:
+            progress("styles", created, total)
+
+
+def seed(
+    users=1000,
+    follows_per_user=20,
+    cards_per_user=5,
+    styles_per_card=3,
+    follow_exponent=1.0,
+    blocked_ratio=0.0,
+    draft_ratio=0.1,
+    random_seed=0,
+    batch_size=BATCH_SIZE,
+    copy=True,
+    progress=None,
+):
+    """
+    Seed a dataset of the given scale. Users are topped up to `users`; the
+    follows, cards and styles are added on top of whatever exists.
+    `styles_per_card` may be a (low, high) range. With `copy`, PostgreSQL
+    databases are loaded with COPY. Returns the seeded user ids.
+    """
+    rng = random.Random(random_seed)
+    user_ids = create_users(users, progress, batch_size)
+    create_follows(
+        rng,
+        user_ids,
+        users * follows_per_user,
+        follow_exponent,
+        blocked_ratio,
+        progress,
+        batch_size,
+        copy,
+    )
+    card_ids = create_cards(
+        rng, user_ids, users * cards_per_user, draft_ratio, progress, batch_size
+    )
+    create_styles(rng, card_ids, styles_per_card, progress, batch_size, copy)
+    reconcile_counters(seeded_users())
+    return user_ids
+
+
+def delete_rows(queryset):
+    """
+    Delete a queryset's rows with one plain DELETE ... WHERE pk IN (SELECT
+    ...) through the cursor, returning how many went. Unlike
+    QuerySet.delete() it doesn't load the rows, follow cascades or send
+    signals, so callers delete dependent rows first.
+    """
+    meta = queryset.model._meta
+    select, params = queryset.values("pk").query.sql_with_params()
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(meta.db_table)} "
+            f"WHERE {quote(meta.pk.column)} IN ({select})",
+            params,
+        )
+        return cursor.rowcount
+
+
+def flush():
+    """
+    Delete the seeded users and everything of theirs with one DELETE per
+    table rather than row by row, along with the presets no card uses any
+    more, then fix the counters of anyone else who followed them or was
+    followed by them. Returns how many users went.
+    """
+    users = seeded_users()
+    cards = Card.objects.filter(creator__in=users)
+    others = (
+        User.objects.exclude(username__startswith=USERNAME_PREFIX)
+        .filter(
+            Q(relationship_as_follower__followed_user__in=users)
+            | Q(relationship_as_followed_user__follower__in=users)
+        )
+        .values_list("pk", flat=True)
+        .distinct()
+    )
+    with transaction.atomic():
+        affected = list(others)
+        unindex_cards(cards)
+        for queryset in (
+            CardStyleDeclaration.objects.filter(card__in=cards),
+            FeedEntry.objects.filter(Q(user__in=users) | Q(card__in=cards)),
+            FollowSuggestion.objects.filter(
+                Q(user__in=users) | Q(suggested_user__in=users)
+            ),
+            FollowRelationship.objects.filter(
+                Q(follower__in=users) | Q(followed_user__in=users)
+            ),
+            cards,
+            Token.objects.filter(user__in=users),
+        ):
+            delete_rows(queryset)
+        prune_presets()
+        deleted = delete_rows(users)
+        reconcile_counters(User.objects.filter(pk__in=affected))
+    return deleted
@@ -1,36 +1,71 @@
-from .models import Card, User, FollowRelationship, CardStyleDeclaration
+from .models import (
+    Card,
+    User,
+    FollowRelationship,
+    CardStyleDeclaration,
+    FollowSuggestion,
+)
 from rest_framework import serializers
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from drf_spectacular.utils import extend_schema_field
+from .metrics import timed_serialization
+from .presets import APPEARANCE_FIELDS, appearance_preset
+from .styles import compact_style_reads, expand_styles, styles_changed
 
 
-class CardStyleBulkCreateUpdateSerializer(serializers.ListSerializer):
+class TimedDataMixin:
+    """Count building .data as serialization time (see api.metrics)."""
+
+    @property
+    def data(self):
+        with timed_serialization():
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
+
+class CardStyleBulkCreateUpdateSerializer(TimedListSerializer):
     def create(self, validated_data):
         styles = [CardStyleDeclaration(**item) for item in validated_data]
         try:
-            return CardStyleDeclaration.objects.bulk_create(styles)
+            created = CardStyleDeclaration.objects.bulk_create(styles)
         except IntegrityError as e:
             raise serializers.ValidationError({"error": str(e)})
+        # bulk_create skips the post_save signals that normally do this
+        styles_changed({style.card_id for style in created})
+        return created
 
     def update(self, instance, validated_data):
-        properties = [obj["property"] for obj in self.validated_data]
-        instances = CardStyleDeclaration.objects.filter(
-            property__in=properties, card_id=instance.id
-        )
-        for style in self.validated_data:
-            serializer = CardStyleDeclarationSerializer(data=style)
-            serializer.is_valid(raise_exception=True)
-            if instances.filter(property=style["property"]):
-                styleInstance = instances.get(property=style["property"])
-                if "boolValue" in style:
-                    styleInstance.boolValue = style["boolValue"]
-                elif "value" in style:
-                    styleInstance.value = style["value"]
-                try:
-                    styleInstance.save()
-                except IntegrityError as e:
-                    raise serializers.ValidationError({"error": str(e)})
-
-        return instances
+        # Upsert on the (property, card) unique constraint so any mix of new
+        # and existing properties costs one INSERT ... ON CONFLICT DO UPDATE.
+        # When a property is repeated in the request, the last one wins.
+        items = {item["property"]: item for item in validated_data}
+        styles = [
+            CardStyleDeclaration(
+                card=instance,
+                property=property,
+                value=item.get("value"),
+                boolValue=item.get("boolValue"),
+            )
+            for property, item in items.items()
+        ]
+        try:
+            with transaction.atomic():
+                CardStyleDeclaration.objects.bulk_create(
+                    styles,
+                    update_conflicts=True,
+                    unique_fields=["property", "card"],
+                    update_fields=["value", "boolValue"],
+                )
+        except IntegrityError as e:
+            raise serializers.ValidationError({"error": str(e)})
+        styles_changed([instance.pk])
+
+        return CardStyleDeclaration.objects.filter(
+            card=instance, property__in=items
+        ).order_by("pk")
 
     def validate(self, data):
         properties = [obj["property"] for obj in data if "property" in obj]
@@ -41,21 +76,83 @@ class CardStyleBulkCreateUpdateSerializer(serializers.ListSerializer):
         return data
 
 
-class CardStyleDeclarationSerializer(serializers.ModelSerializer):
+class CardStyleDeclarationSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = CardStyleDeclaration
         fields = ("property", "value", "boolValue")
         list_serializer_class = CardStyleBulkCreateUpdateSerializer
 
 
-class CardSerializer(serializers.ModelSerializer):
+@extend_schema_field(CardStyleDeclarationSerializer(many=True))
+class CompactStylesField(serializers.Field):
+    """A card's styles read from Card.compact_styles (see api.styles)."""
+
+    def __init__(self, **kwargs):
+        super().__init__(source="compact_styles", read_only=True, **kwargs)
+
+    def to_representation(self, value):
+        return expand_styles(value)
+
+
+def appearance_field(name):
+    """A card appearance field, stored on the card's StylePreset (see api.presets)."""
+    return serializers.CharField(
+        source=f"preset.{name}",
+        max_length=255,
+        allow_null=True,
+        allow_blank=True,
+        required=False,
+    )
+
+
+class CardSerializer(TimedDataMixin, serializers.ModelSerializer):
     creator = serializers.ReadOnlyField(source="creator.username")
     styles = CardStyleDeclarationSerializer(many=True, read_only=True)
     creator_id = serializers.ReadOnlyField(source="creator.id")
+    background_color = appearance_field("background_color")
+    back_background_color = appearance_field("back_background_color")
+    font = appearance_field("font")
+    font_size = appearance_field("font_size")
+    text_align = appearance_field("text_align")
+
+    def __init__(self, *args, fields=None, **kwargs):
+        # `fields` limits the output to those field names (see api.sparse)
+        super().__init__(*args, **kwargs)
+        if compact_style_reads():
+            self.fields["styles"] = CompactStylesField()
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def create(self, validated_data):
+        appearance = validated_data.pop("preset", {})
+        with transaction.atomic():
+            validated_data["preset_id"] = appearance_preset(None, appearance)
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        appearance = validated_data.pop("preset", None)
+        with transaction.atomic():
+            if appearance:
+                instance.preset_id = appearance_preset(instance.pk, appearance)
+            return super().update(instance, validated_data)
 
     class Meta:
         model = Card
-        fields = "__all__"
+        fields = [
+            "id",
+            "creator",
+            "styles",
+            "creator_id",
+            "created_at",
+            "updated_at",
+            "front_text",
+            "back_text",
+            "imageURL",
+            *APPEARANCE_FIELDS,
+            "draft",
+        ]
+        list_serializer_class = TimedListSerializer
         read_only_fields = [
             "id",
             "creator",
@@ -66,14 +163,39 @@ class CardSerializer(serializers.ModelSerializer):
         ]
 
 
-class FollowerUserSerializer(serializers.ModelSerializer):
-    relationship_created = serializers.SlugRelatedField(
-        slug_field="created_at", read_only=True
-    )
+class FollowerUserSerializer(TimedDataMixin, serializers.ModelSerializer):
+    # annotated by UserQuerySet.followed_by_user / following_user
+    relationship_created = serializers.DateTimeField(read_only=True)
+    # annotated by UserQuerySet.with_follow_flags
+    followed_by_me = serializers.BooleanField(read_only=True)
+    follows_me = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = User
+        fields = [
+            "id",
+            "username",
+            "relationship_created",
+            "followed_by_me",
+            "follows_me",
+        ]
+        list_serializer_class = TimedListSerializer
 
+
+class UserProfileSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ["id", "username", "relationship_created"]
+        fields = ["id", "username", "follower_count", "following_count", "card_count"]
+
+
+class FollowSuggestionSerializer(TimedDataMixin, serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source="suggested_user.id")
+    username = serializers.ReadOnlyField(source="suggested_user.username")
+
+    class Meta:
+        model = FollowSuggestion
+        fields = ["id", "username", "score"]
+        list_serializer_class = TimedListSerializer
 
 
 class FollowRelationshipSerializer(serializers.ModelSerializer):
@@ -86,3 +208,9 @@ class FollowRelationshipSerializer(serializers.ModelSerializer):
             "updated_at",
             "follower",
         ]
+
+
+class BulkFollowSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=100
+    )
@@ -0,0 +1,131 @@
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_token
+from .caching import invalidate_card, invalidate_cards
+from .counters import adjust_card_count, adjust_follow_counts
+from .feed import backfill_follow, fan_out_card, remove_follow
+from .metrics import install_query_recorder
+from .models import Card, CardStyleDeclaration, FollowRelationship, User
+from .search import index_card, index_cards, unindex_card
+from .styles import styles_changed
+
+
+@receiver(post_save, sender=Card)
+def update_card_search_index(sender, instance, **kwargs):
+    index_card(instance)
+
+
+@receiver(post_save, sender=User)
+def reindex_renamed_users_cards(sender, instance, **kwargs):
+    # cards are indexed under their creator's username
+    if instance.username_changed:
+        index_cards(instance.cards.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=User)
+def touch_renamed_users_cards(sender, instance, **kwargs):
+    # cards show their creator's username, so their ETags and cached
+    # responses must change with it
+    if instance.username_changed:
+        card_ids = list(instance.cards.values_list("pk", flat=True))
+        instance.cards.update(updated_at=timezone.now())
+        invalidate_cards(card_ids)
+
+
+@receiver(post_delete, sender=Card)
+def remove_card_from_search_index(sender, instance, **kwargs):
+    unindex_card(instance.pk)
+
+
+@receiver(post_save, sender=Card)
+def fan_out_published_card(sender, instance, **kwargs):
+    if instance.was_published:
+        fan_out_card(instance)
+
+
+@receiver(post_save, sender=Card)
+def count_published_card(sender, instance, **kwargs):
+    if instance.was_published:
+        adjust_card_count(instance.creator_id, 1)
+    elif instance.was_unpublished:
+        adjust_card_count(instance.creator_id, -1)
+
+
+@receiver(post_delete, sender=Card)
+def count_deleted_card(sender, instance, **kwargs):
+    if not instance.draft:
+        adjust_card_count(instance.creator_id, -1)
+
+
+@receiver(post_save, sender=FollowRelationship)
+def sync_feed_with_follow(sender, instance, **kwargs):
+    if not instance.status_changed:
+        return
+    if instance.status == FollowRelationship.Status.ACTIVE:
+        backfill_follow(instance.follower_id, instance.followed_user_id)
+    else:
+        remove_follow(instance.follower_id, instance.followed_user_id)
+
+
+@receiver(post_save, sender=FollowRelationship)
+def count_follow(sender, instance, created, **kwargs):
+    if not instance.status_changed:
+        return
+    if instance.status == FollowRelationship.Status.ACTIVE:
+        adjust_follow_counts(instance.follower_id, instance.followed_user_id, 1)
+    elif not created:
+        adjust_follow_counts(instance.follower_id, instance.followed_user_id, -1)
+
+
+@receiver(post_delete, sender=FollowRelationship)
+def remove_unfollowed_from_feed(sender, instance, **kwargs):
+    remove_follow(instance.follower_id, instance.followed_user_id)
+
+
+@receiver(post_delete, sender=FollowRelationship)
+def count_unfollow(sender, instance, **kwargs):
+    if instance.status == FollowRelationship.Status.ACTIVE:
+        adjust_follow_counts(instance.follower_id, instance.followed_user_id, -1)
+
+
+@receiver(post_save, sender=Card)
+@receiver(post_delete, sender=Card)
+def invalidate_cached_card(sender, instance, **kwargs):
+    invalidate_card(instance.pk)
+
+
+@receiver(post_save, sender=CardStyleDeclaration)
+def card_styles_saved(sender, instance, **kwargs):
+    styles_changed([instance.card_id])
+
+
+@receiver(post_delete, sender=CardStyleDeclaration)
+def card_styles_deleted(sender, instance, origin=None, **kwargs):
+    # deleting a card (or its creator) cascades to its styles; the card is
+    # gone, so there's nothing to sync
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model is CardStyleDeclaration:
+        styles_changed([instance.card_id])
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_tokens_for_saved_user(sender, instance, created, **kwargs):
+    if created:
+        return
+    for key in Token.objects.filter(user=instance).values_list("key", flat=True):
+        forget_token(key)
+
+
+@receiver(connection_created)
+def record_request_queries(sender, connection, **kwargs):
+    install_query_recorder(connection)
@@ -0,0 +1,87 @@
+"""
+Sparse fieldsets for card reads.
+
+GETs may pass ?fields=id,front_text to get only those fields, or
+?omit=styles to drop some (both together apply fields, then omit). The SQL
+is trimmed to match: unrequested columns are deferred with .only(), the
+creator join is dropped unless a creator field is wanted and the styles
+prefetch is skipped unless styles are.
+"""
+
+from django.utils.functional import cached_property
+from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+
+# needed whatever is requested: the primary key, created_at for ordering
+# and cursor positions, and updated_at for ETags (see api.conditional)
+ALWAYS_SELECTED = ["id", "created_at", "updated_at"]
+
+
+def parse_field_list(value):
+    return [name for name in (part.strip() for part in value.split(",")) if name]
+
+
+def requested_fields(query_params, available):
+    """
+    The fields asked for with ?fields= and ?omit=, in `available` order, or
+    None for all of them. Unknown names are a ValidationError.
+    """
+    if "fields" not in query_params and "omit" not in query_params:
+        return None
+    wanted = {}
+    for param in ("fields", "omit"):
+        if param in query_params:
+            wanted[param] = parse_field_list(query_params[param])
+            unknown = [name for name in wanted[param] if name not in available]
+            if unknown:
+                raise ValidationError(
+                    {param: [f"Unknown fields: {', '.join(unknown)}."]}
+                )
+    fields = wanted.get("fields") or available
+    return [
+        name
+        for name in available
+        if name in fields and name not in wanted.get("omit", ())
+    ]
+
+
+def prune_queryset(queryset, serializer, fields):
+    """Load only what serializing `fields` with `serializer` needs."""
+    sources = [serializer.fields[name].source_attrs for name in fields]
+    if ["styles"] not in sources:
+        queryset = queryset.prefetch_related(None)
+    relations = [attrs[0] for attrs in sources if len(attrs) > 1]
+    queryset = queryset.select_related(None)
+    if relations:
+        queryset = queryset.select_related(*relations)
+    columns = ["__".join(attrs) for attrs in sources if attrs != ["styles"]]
+    return queryset.only(*dict.fromkeys(ALWAYS_SELECTED + relations + columns))
+
+
+class SparseFieldsMixin:
+    """
+    ?fields= and ?omit= for the GETs of a view whose serializer takes a
+    `fields` argument (see CardSerializer). The view passes its querysets
+    through sparse_queryset.
+    """
+
+    @cached_property
+    def sparse_fields(self):
+        if self.request is None or self.request.method not in permissions.SAFE_METHODS:
+            return None
+        serializer_class = self.get_serializer_class()
+        return requested_fields(
+            self.request.query_params, list(serializer_class().fields)
+        )
+
+    def sparse_queryset(self, queryset):
+        if self.sparse_fields is None:
+            return queryset
+        return prune_queryset(
+            queryset, self.get_serializer_class()(), self.sparse_fields
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        if self.sparse_fields is not None:
+            kwargs.setdefault("fields", self.sparse_fields)
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,22 @@
+from itertools import islice
+
+from .renderers import FastJSONRenderer
+
+
+def stream_json_list(
+    queryset, serializer_class, context=None, chunk_size=100, fields=None
+):
+    """
+    Yield a JSON array of serialized objects chunk by chunk, reading rows
+    from a server-side cursor so only one chunk is held in memory at a time.
+    `fields` is passed on to serializers that take it (see api.sparse).
+    """
+    kwargs = {} if fields is None else {"fields": fields}
+    renderer = FastJSONRenderer()
+    rows = queryset.iterator(chunk_size=chunk_size)
+    separator = b"["
+    while chunk := list(islice(rows, chunk_size)):
+        data = serializer_class(chunk, many=True, context=context, **kwargs).data
+        yield separator + renderer.render(data)[1:-1]
+        separator = b","
+    yield b"[]" if separator == b"[" else b"]"
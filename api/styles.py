@@ -0,0 +1,123 @@
+"""
+Compact style storage.
+
+CardStyleDeclaration rows are the source of truth for a card's styles, and
+every card also keeps a copy in Card.compact_styles, a JSON list of
+[property, value, boolValue] triples sorted by property. It is rewritten
+whenever the declarations change: by styles_changed for API writes and
+signals (when they commit, once per request) and by sync_compact_styles
+directly for bulk inserts such as seeding. With CARD_STYLE_STORAGE =
+"compact", card reads serve styles from that column, so they need no
+styles query or join. Rebuild every card's copy with
+`manage.py sync_compact_styles`.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .caching import invalidate_card
+from .models import Card, CardStyleDeclaration
+
+BATCH_SIZE = 1000
+# the CardStyleDeclaration fields stored in each triple, in order
+STYLE_FIELDS = ("property", "value", "boolValue")
+
+# the cards changed inside the current batched_style_changes block
+_pending_changes = ContextVar("pending_style_changes", default=None)
+
+
+def compact_style_reads():
+    return settings.CARD_STYLE_STORAGE == "compact"
+
+
+def with_styles(queryset):
+    """
+    Set up a card queryset for serializing: the appearance preset joined in
+    (see api.presets), and styles read from the compact_styles column or in
+    "rows" mode a prefetch of the declarations, in the same order (leaving
+    the column unloaded).
+    """
+    queryset = queryset.select_related("preset")
+    if compact_style_reads():
+        return queryset
+    return queryset.prefetch_related(
+        Prefetch("styles", queryset=CardStyleDeclaration.objects.order_by("property"))
+    ).defer("compact_styles")
+
+
+def expand_styles(triples):
+    """Compact triples as the dicts CardStyleDeclarationSerializer outputs."""
+    return [dict(zip(STYLE_FIELDS, triple)) for triple in triples]
+
+
+def sync_compact_styles(card_ids, touch=False):
+    """
+    Rewrite compact_styles for the given cards from their declaration rows,
+    also bumping updated_at with `touch`. One SELECT and one UPDATE per batch.
+    """
+    card_ids = list(card_ids)
+    fields = ["compact_styles", "updated_at"] if touch else ["compact_styles"]
+    now = timezone.now()
+    for start in range(0, len(card_ids), BATCH_SIZE):
+        batch = card_ids[start : start + BATCH_SIZE]
+        styles = defaultdict(list)
+        for card_id, *triple in (
+            CardStyleDeclaration.objects.filter(card_id__in=batch)
+            .order_by("card_id", "property")
+            .values_list("card_id", *STYLE_FIELDS)
+        ):
+            styles[card_id].append(triple)
+        Card.objects.bulk_update(
+            [Card(pk=pk, compact_styles=styles[pk], updated_at=now) for pk in batch],
+            fields,
+        )
+
+
+def sync_style_changes(card_ids):
+    """Rewrite changed cards' compact styles, bump their updated_at and uncache them."""
+    sync_compact_styles(card_ids, touch=True)
+    for card_id in card_ids:
+        invalidate_card(card_id)
+
+
+@contextmanager
+def batched_style_changes():
+    """
+    Collect the styles_changed calls made inside the block and sync their
+    cards together, with one on_commit callback, when it exits. Wrap code
+    that changes declarations one row at a time, such as a queryset
+    delete (one signal per row). Nested blocks join the outermost one.
+    """
+    if _pending_changes.get() is not None:
+        yield
+        return
+    card_ids = set()
+    token = _pending_changes.set(card_ids)
+    try:
+        yield
+    finally:
+        _pending_changes.reset(token)
+        # also after an error: what was committed still needs syncing
+        if card_ids:
+            transaction.on_commit(partial(sync_style_changes, card_ids))
+
+
+def styles_changed(card_ids):
+    """
+    Call after changing cards' declarations. When the transaction commits
+    (right away outside one), rewrites their compact styles, bumps
+    updated_at (so ETags change) and drops them from the response cache. Inside
+    batched_style_changes, that happens once for the whole block.
+    """
+    pending = _pending_changes.get()
+    if pending is not None:
+        pending.update(card_ids)
+    else:
+        transaction.on_commit(partial(sync_style_changes, set(card_ids)))
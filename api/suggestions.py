@@ -0,0 +1,136 @@
+"""
+Friends-of-friends follow suggestions.
+
+A user's candidates are the users followed by the users they follow, scored
+by how many of those they share. Users are processed in batches: one
+grouped query per batch walks the two hops of the follow graph in the
+database, so memory is bounded by the batch rather than the whole graph.
+Each batch's FollowSuggestion rows are replaced in one transaction.
+"""
+
+import heapq
+from collections import defaultdict
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import FollowRelationship, FollowSuggestion, User
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_LIMIT = 50
+
+
+def _scores(user_ids):
+    """{user_id: {candidate_id: shared follows}} for a batch of users."""
+    rows = (
+        FollowRelationship.objects.active()
+        .filter(
+            follower_id__in=user_ids,
+            followed_user__relationship_as_follower__status=FollowRelationship.Status.ACTIVE,
+        )
+        .values_list(
+            "follower_id", "followed_user__relationship_as_follower__followed_user_id"
+        )
+        .annotate(score=Count("pk"))
+        .order_by()
+    )
+    scores = defaultdict(dict)
+    for user_id, candidate_id, score in rows.iterator():
+        scores[user_id][candidate_id] = score
+    return scores
+
+
+def _excluded(user_ids):
+    """{user_id: ids never to suggest}: themselves, anyone they already follow
+    or are blocked by, and followers they have blocked."""
+    excluded = defaultdict(set)
+    for user_id in user_ids:
+        excluded[user_id].add(user_id)
+    followed = FollowRelationship.objects.filter(follower_id__in=user_ids)
+    for user_id, other_id in followed.values_list("follower_id", "followed_user_id"):
+        excluded[user_id].add(other_id)
+    blocked = FollowRelationship.objects.blocked().filter(followed_user_id__in=user_ids)
+    for user_id, other_id in blocked.values_list("followed_user_id", "follower_id"):
+        excluded[user_id].add(other_id)
+    return excluded
+
+
+def refresh_batch(user_ids, limit=DEFAULT_LIMIT):
+    """Recompute and store the top `limit` suggestions for each user id."""
+    scores = _scores(user_ids)
+    excluded = _excluded(user_ids)
+    suggestions = []
+    for user_id in user_ids:
+        candidates = (
+            (score, candidate_id)
+            for candidate_id, score in scores[user_id].items()
+            if candidate_id not in excluded[user_id]
+        )
+        for score, candidate_id in heapq.nlargest(limit, candidates):
+            suggestions.append(
+                FollowSuggestion(
+                    user_id=user_id, suggested_user_id=candidate_id, score=score
+                )
+            )
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user_id__in=user_ids).delete()
+        FollowSuggestion.objects.bulk_create(suggestions, batch_size=1000)
+    return len(suggestions)
+
+
+def users_affected_since(since):
+    """
+    Users whose suggestions may have changed since `since`: anyone who
+    followed someone new, and anyone following them (their second hop grew).
+    Unfollows leave no timestamp behind; a periodic full refresh covers them,
+    and suggestions_for() already hides users who are followed again.
+    """
+    changed = FollowRelationship.objects.filter(created_at__gte=since).values(
+        "follower_id"
+    )
+    return User.objects.filter(
+        Q(pk__in=changed)
+        | Q(
+            pk__in=FollowRelationship.objects.active()
+            .filter(followed_user_id__in=changed)
+            .values("follower_id")
+        )
+    )
+
+
+def refresh_suggestions(users=None, batch_size=DEFAULT_BATCH_SIZE, limit=DEFAULT_LIMIT):
+    """
+    Refresh suggestions for `users` (a User queryset; everyone by default),
+    yielding (users processed, suggestions written) after each batch.
+    """
+    users = User.objects.all() if users is None else users
+    user_ids = (
+        users.order_by("pk")
+        .values_list("pk", flat=True)
+        .iterator(chunk_size=batch_size)
+    )
+    processed = written = 0
+    while batch := list(islice(user_ids, batch_size)):
+        written += refresh_batch(batch, limit)
+        processed += len(batch)
+        yield processed, written
+
+
+def suggestions_for(user):
+    """A user's stored suggestions, minus anyone they've since followed or blocked."""
+    return (
+        FollowSuggestion.objects.filter(user=user)
+        .exclude(
+            suggested_user__in=FollowRelationship.objects.filter(follower=user).values(
+                "followed_user"
+            )
+        )
+        .exclude(
+            suggested_user__in=FollowRelationship.objects.blocked()
+            .filter(followed_user=user)
+            .values("follower")
+        )
+        .select_related("suggested_user")
+        .order_by("-score", "suggested_user_id")
+    )
@@ -1,3 +1,1766 @@
-from django.test import TestCase
+import datetime
+import decimal
+import io
+import json
+import os
+import tempfile
+import time
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections
+from django.db.models import Count
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve, reverse
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from cards.sentry import traces_sampler
+
+from . import async_views, follows
+from . import urls as api_urls
+from .authentication import token_cache_key
+from .caching import cache_stats
+from .metrics import registry
+from .counters import reconcile_counters
+from .fastpath import represent
+from .follows import follow_users, unfollow_users
+from .models import (
+    Card,
+    CardStyleDeclaration,
+    FeedEntry,
+    FollowRelationship,
+    StylePreset,
+    User,
+)
+from .renderers import FastJSONRenderer
+from .serializers import CardSerializer
+from .presets import APPEARANCE_FIELDS
+from .styles import batched_style_changes, sync_compact_styles
+from .suggestions import refresh_suggestions, users_affected_since
+
+
+def make_cards(user, count, styles_per_card=2, **kwargs):
+    cards = [
+        Card.objects.create(creator=user, front_text=f"card {i}", **kwargs)
+        for i in range(count)
+    ]
+    CardStyleDeclaration.objects.bulk_create(
+        [
+            CardStyleDeclaration(card=card, property=f"prop-{j}", value="x")
+            for card in cards
+            for j in range(styles_per_card)
+        ]
+    )
+    sync_compact_styles([card.pk for card in cards])
+    return cards
+
+
+class CardQueryCountTests(APITestCase):
+    """
+    Card endpoints should run a constant number of queries no matter how
+    many cards (or styles per card) are on the page.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f"user{i}") for i in range(5)]
+        for user in cls.users:
+            make_cards(user, 4, styles_per_card=3)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list_query_count(self):
+        # count, page of cards (joined to creator), styles
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("cards-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertEqual(len(response.data["results"][0]["styles"]), 3)
+
+    def test_retrieve_query_count(self):
+        card = Card.objects.first()
+        # card (joined to creator), styles
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("cards-detail", args=[card.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["creator"], card.creator.username)
+
+    def test_me_query_count(self):
+        user = self.users[0]
+        self.client.force_authenticate(user)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("cards-me"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 4)
+
+
+class CardCursorPaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("writer")
+        make_cards(cls.user, 25, styles_per_card=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_mode_skips_count(self):
+        # page of cards (joined to creator), prefetched styles; no COUNT(*)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("cards-list"), {"pagination": "cursor"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("count", response.data)
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_cursor_pages_are_stable_under_inserts(self):
+        first = self.client.get(reverse("cards-list"), {"pagination": "cursor"})
+        make_cards(self.user, 5, styles_per_card=0)
+        second = self.client.get(first.data["next"])
+        seen = [card["id"] for card in first.data["results"]]
+        ids = [card["id"] for card in second.data["results"]]
+        self.assertEqual(len(ids), 10)
+        self.assertFalse(set(seen) & set(ids))
+        self.assertTrue(max(ids) < min(seen))
+
+    def test_cards_sharing_a_timestamp_are_not_skipped_or_repeated(self):
+        Card.objects.update(created_at=Card.objects.earliest("pk").created_at)
+        expected = list(Card.objects.order_by("-id").values_list("id", flat=True))
+        response = self.client.get(
+            reverse("cards-list"), {"pagination": "cursor", "page_size": 4}
+        )
+        # removing a card already seen doesn't shift the following pages
+        Card.objects.get(pk=response.data["results"][0]["id"]).delete()
+        seen = []
+        while True:
+            seen += [card["id"] for card in response.data["results"]]
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"])
+        self.assertEqual(seen, expected)
+
+        last_page = [card["id"] for card in response.data["results"]]
+        earlier = []
+        while response.data["previous"]:
+            response = self.client.get(response.data["previous"])
+            earlier = [card["id"] for card in response.data["results"]] + earlier
+        self.assertEqual(earlier, [pk for pk in expected[1:] if pk not in last_page])
+
+    def test_invalid_cursor_is_a_404(self):
+        response = self.client.get(reverse("cards-list"), {"cursor": "cD1ub3BlfDE="})
+        self.assertEqual(response.status_code, 404)
+
+
+class MyCardsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("writer")
+        make_cards(cls.user, 15, styles_per_card=1)
+        make_cards(cls.user, 3, styles_per_card=1, draft=True)
+        make_cards(User.objects.create_user("someone-else"), 5)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_me_is_paginated(self):
+        response = self.client.get(reverse("cards-me"))
+        self.assertEqual(response.data["count"], 18)
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_me_filters_drafts_and_search(self):
+        response = self.client.get(reverse("cards-me"), {"draft": "true"})
+        self.assertEqual(response.data["count"], 3)
+        response = self.client.get(reverse("cards-me"), {"draft": "false"})
+        self.assertEqual(response.data["count"], 15)
+        response = self.client.get(reverse("cards-me"), {"search": "card 1"})
+        self.assertEqual(response.data["count"], 7)
+
+    def test_me_stream(self):
+        response = self.client.get(reverse("cards-me"), {"stream": "true"})
+        self.assertTrue(response.streaming)
+        cards = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(len(cards), 18)
+        self.assertEqual(
+            cards[0]["styles"],
+            [{"property": "prop-0", "value": "x", "boolValue": None}],
+        )
+
+    def test_me_stream_sparse_fields(self):
+        def stream(params, queries):
+            response = self.client.get(
+                reverse("cards-me"), {"stream": "true", **params}
+            )
+            with self.assertNumQueries(queries):
+                cards = json.loads(b"".join(response.streaming_content))
+            self.assertEqual(len(cards), 18)
+            return list(cards[0])
+
+        # the cards, then the styles prefetch only when styles are wanted
+        every = stream({}, 2)
+        self.assertEqual(stream({"fields": "id,front_text"}, 1), ["id", "front_text"])
+        self.assertEqual(
+            stream({"omit": "styles"}, 1), [f for f in every if f != "styles"]
+        )
+
+    def test_me_stream_empty(self):
+        response = self.client.get(
+            reverse("cards-me"), {"stream": "true", "search": "nothing"}
+        )
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), [])
+
+
+class CardSearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice")
+        cls.bob = User.objects.create_user("bob")
+        Card.objects.create(
+            creator=cls.alice, front_text="Happy birthday", back_text="Cake!"
+        )
+        Card.objects.create(
+            creator=cls.bob, front_text="Get well soon", back_text="Birthdays later"
+        )
+        Card.objects.create(creator=cls.bob, front_text="Congratulations")
+        Card.objects.create(creator=cls.alice, front_text="birthday", draft=True)
+
+    def search(self, term):
+        response = self.client.get(reverse("cards-list"), {"search": term})
+        return [card["front_text"] for card in response.data["results"]]
+
+    def test_ranks_front_text_matches_first(self):
+        self.assertEqual(self.search("birthday"), ["Happy birthday", "Get well soon"])
+
+    def test_matches_word_prefixes_and_usernames(self):
+        self.assertEqual(self.search("congrat"), ["Congratulations"])
+        self.assertEqual(self.search("bob"), ["Congratulations", "Get well soon"])
+        self.assertEqual(self.search("bob birth"), ["Get well soon"])
+
+    def test_index_follows_edits_and_deletes(self):
+        card = Card.objects.get(front_text="Congratulations")
+        card.front_text = "Congrats on the birthday"
+        card.save()
+        self.assertEqual(self.search("congratulations"), [])
+        self.assertIn("Congrats on the birthday", self.search("birthday"))
+        card.delete()
+        self.assertEqual(self.search("congrats"), [])
+
+    def test_index_follows_username_changes(self):
+        bob = User.objects.get(pk=self.bob.pk)
+        bob.username = "roberta"
+        bob.save()
+        self.assertEqual(self.search("roberta"), ["Congratulations", "Get well soon"])
+        self.assertEqual(self.search("bob"), [])
+
+
+class FeedTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user("reader")
+        cls.friend = User.objects.create_user("friend")
+        cls.blocker = User.objects.create_user("blocker")
+        cls.stranger = User.objects.create_user("stranger")
+        cls.reader.follow_another_user(cls.friend)
+        cls.reader.follow_another_user(cls.blocker)
+        cls.blocker.block_follower(cls.reader)
+        make_cards(cls.friend, 12)
+        make_cards(cls.friend, 2, draft=True)
+        make_cards(cls.blocker, 3)
+        make_cards(cls.stranger, 3)
+
+    def test_requires_login(self):
+        response = self.client.get(reverse("feed"))
+        self.assertEqual(response.status_code, 401)
+
+    def test_feed_has_followed_users_published_cards(self):
+        self.client.force_authenticate(self.reader)
+        # page of cards (joined to follows and creator), prefetched styles
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("feed"))
+        self.assertEqual(len(response.data["results"]), 10)
+        next_page = self.client.get(response.data["next"])
+        self.assertEqual(len(next_page.data["results"]), 2)
+        cards = response.data["results"] + next_page.data["results"]
+        self.assertEqual({card["creator"] for card in cards}, {"friend"})
+        self.assertFalse(any(card["draft"] for card in cards))
+
+
+@override_settings(FEED_MODE="hybrid", FEED_FANOUT_MAX_FOLLOWERS=2)
+class HybridFeedTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user("reader")
+        cls.friend = User.objects.create_user("friend")
+        cls.celebrity = User.objects.create_user("celebrity")
+        for i in range(3):
+            User.objects.create_user(f"fan{i}").follow_another_user(cls.celebrity)
+
+    def setUp(self):
+        self.client.force_authenticate(self.reader)
+
+    def feed(self):
+        response = self.client.get(reverse("feed"))
+        return [card["front_text"] for card in response.data["results"]]
+
+    def test_cards_fan_out_on_publish(self):
+        self.reader.follow_another_user(self.friend)
+        card = Card.objects.create(creator=self.friend, front_text="hello", draft=True)
+        self.assertFalse(FeedEntry.objects.exists())
+        card = Card.objects.get(pk=card.pk)
+        card.draft = False
+        card.save()
+        self.assertTrue(FeedEntry.objects.filter(user=self.reader, card=card).exists())
+        self.assertEqual(self.feed(), ["hello"])
+
+    def test_high_follower_cards_are_read_at_request_time(self):
+        self.reader.follow_another_user(self.celebrity)
+        Card.objects.create(creator=self.celebrity, front_text="big news")
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.feed(), ["big news"])
+
+    def test_follow_changes_update_feed(self):
+        Card.objects.create(creator=self.friend, front_text="old card")
+        self.reader.follow_another_user(self.friend)
+        self.assertEqual(self.feed(), ["old card"])
+        self.friend.block_follower(self.reader)
+        self.assertEqual(self.feed(), [])
+        self.friend.unblock_follower(self.reader)
+        self.assertEqual(self.feed(), ["old card"])
+        self.reader.unfollow_another_user(self.friend)
+        self.assertEqual(self.feed(), [])
+
+    def test_backfill_command(self):
+        self.reader.follow_another_user(self.friend)
+        Card.objects.create(creator=self.friend, front_text="card")
+        call_command("backfill_feed", "--clear", stdout=io.StringIO())
+        self.assertEqual(FeedEntry.objects.count(), 1)
+        self.assertEqual(self.feed(), ["card"])
+
+    def test_cards_stay_when_creators_cross_the_threshold(self):
+        self.reader.follow_another_user(self.friend)
+        self.reader.follow_another_user(self.celebrity)
+        Card.objects.create(creator=self.friend, front_text="pushed")
+        Card.objects.create(creator=self.celebrity, front_text="pulled")
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=100):
+            # celebrity's earlier card was pulled, not pushed
+            self.assertEqual(self.feed(), ["pulled", "pushed"])
+            Card.objects.create(creator=self.celebrity, front_text="pushed too")
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=0):
+            self.assertEqual(self.feed(), ["pushed too", "pulled", "pushed"])
+
+
+class CardStyleUpdateTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("writer")
+        cls.card = make_cards(cls.user, 1, styles_per_card=0)[0]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        self.url = reverse("card-style-edit", args=[self.card.pk])
+
+    def patch_styles(self, count):
+        styles = [{"property": f"prop-{i}", "value": f"v{i}"} for i in range(count)]
+        return self.client.patch(self.url, styles, format="json")
+
+    def test_upserts_new_and_existing_properties(self):
+        CardStyleDeclaration.objects.create(
+            card=self.card, property="color", value="red"
+        )
+        response = self.client.patch(
+            self.url,
+            [
+                {"property": "color", "value": "blue"},
+                {"property": "italic", "boolValue": True},
+            ],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data,
+            [
+                {"property": "color", "value": "blue", "boolValue": None},
+                {"property": "italic", "value": None, "boolValue": True},
+            ],
+        )
+
+    def test_switching_between_value_and_bool_value(self):
+        CardStyleDeclaration.objects.create(
+            card=self.card, property="bold", value="yes"
+        )
+        response = self.client.patch(
+            self.url, [{"property": "bold", "boolValue": False}], format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        style = self.card.styles.get(property="bold")
+        self.assertEqual((style.value, style.boolValue), (None, False))
+
+    def test_rejects_styles_with_both_or_neither_value(self):
+        response = self.client.patch(self.url, [{"property": "color"}], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.card.styles.exists())
+
+    def test_query_count_is_constant(self):
+        self.patch_styles(2)
+        with CaptureQueriesContext(connection) as few:
+            self.patch_styles(2)
+        with CaptureQueriesContext(connection) as many:
+            response = self.patch_styles(20)
+        self.assertEqual(len(response.data), 20)
+        self.assertEqual(len(few), len(many))
+
+    def test_only_creator_can_update(self):
+        self.client.force_authenticate(User.objects.create_user("intruder"))
+        response = self.patch_styles(1)
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CARD_CACHE_TIMEOUT=300)
+class CardResponseCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("writer")
+        cls.card, cls.other_card = make_cards(cls.user, 2)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_reads_are_cached(self):
+        url = reverse("cards-detail", args=[self.card.pk])
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(cache_stats(), {"hits": 1, "misses": 1})
+
+    def test_list_pages_are_cached_per_query_string(self):
+        self.client.get(reverse("cards-list"))
+        response = self.client.get(reverse("cards-list"), {"search": "card"})
+        self.assertEqual(response["X-Cache"], "MISS")
+        response = self.client.get(reverse("cards-list"))
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_authenticated_reads_skip_the_cache(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse("cards-list"))
+        self.assertNotIn("X-Cache", response)
+
+    def test_card_changes_invalidate(self):
+        url = reverse("cards-detail", args=[self.card.pk])
+        other_url = reverse("cards-detail", args=[self.other_card.pk])
+        self.client.get(url)
+        self.client.get(other_url)
+        self.client.get(reverse("cards-list"))
+
+        self.card.front_text = "edited"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.card.save()
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["front_text"], "edited")
+        self.assertEqual(self.client.get(other_url)["X-Cache"], "HIT")
+        self.assertEqual(self.client.get(reverse("cards-list"))["X-Cache"], "MISS")
+
+    def test_style_changes_invalidate(self):
+        url = reverse("cards-detail", args=[self.card.pk])
+        self.client.get(url)
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse("card-style-edit", args=[self.card.pk]),
+                [{"property": "prop-0", "value": "changed"}],
+                format="json",
+            )
+        self.client.force_authenticate(None)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["styles"][0]["value"], "changed")
+
+    def test_invalidation_waits_for_the_commit(self):
+        url = reverse("cards-detail", args=[self.card.pk])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.card.front_text = "edited"
+            self.card.save()
+            # a read before the commit still sees the cached response
+            self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+
+class ConditionalGetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("writer")
+        cls.card = make_cards(cls.user, 1)[0]
+
+    def setUp(self):
+        cache.clear()
+        self.detail_url = reverse("cards-detail", args=[self.card.pk])
+
+    def assertNotModified(self, url, response, queries=1):
+        # only the validators are loaded; nothing is serialized
+        with self.assertNumQueries(queries):
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again["ETag"], response["ETag"])
+
+    def test_detail_list_and_styles_send_validators(self):
+        # the list page's timestamps come with a COUNT(*), as on a full read
+        urls = [
+            (self.detail_url, 1),
+            (reverse("cards-list"), 2),
+            (reverse("card-styles", args=[self.card.pk]), 1),
+        ]
+        for url, queries in urls:
+            with self.subTest(url=url), self.settings(CARD_CACHE_TIMEOUT=0):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("ETag", response)
+                # list pages have no Last-Modified (see api.conditional)
+                self.assertEqual(
+                    "Last-Modified" in response, url != reverse("cards-list")
+                )
+                self.assertNotModified(url, response, queries)
+
+    def test_plain_reads_build_validators_from_the_page(self):
+        Card.objects.create(creator=self.user, front_text="another")
+        url = reverse("cards-list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertNotIn("MAX(", " ".join(query["sql"] for query in queries))
+        # a different page of the same list has its own ETag
+        page = self.client.get(url, {"page_size": 1})
+        self.assertNotEqual(page["ETag"], response["ETag"])
+        again = self.client.get(url, {"page_size": 1}, HTTP_IF_NONE_MATCH=page["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+    def test_if_modified_since(self):
+        response = self.client.get(self.detail_url)
+        again = self.client.get(
+            self.detail_url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(again.status_code, 304)
+
+    @override_settings(CARD_CACHE_TIMEOUT=300)
+    def test_cached_responses_answer_conditional_requests(self):
+        response = self.client.get(self.detail_url)
+        with self.assertNumQueries(0):
+            again = self.client.get(
+                self.detail_url, HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        self.assertEqual(again.status_code, 304)
+
+    def test_style_changes_change_etag(self):
+        response = self.client.get(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            CardStyleDeclaration.objects.create(
+                card=self.card, property="color", value="red"
+            )
+        again = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 200)
+        self.assertNotEqual(again["ETag"], response["ETag"])
+
+    def test_deleting_a_card_changes_list_etag(self):
+        Card.objects.create(creator=self.user, front_text="another")
+        url = reverse("cards-list")
+        response = self.client.get(url)
+        Card.objects.get(front_text="another").delete()
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.data["count"], 1)
+
+    def test_deleting_a_card_isnt_hidden_by_if_modified_since(self):
+        Card.objects.create(creator=self.user, front_text="another")
+        url = reverse("cards-list")
+        response = self.client.get(url, {"page_size": 1})
+        Card.objects.get(front_text="another").delete()
+        # the older card now on the page was modified before the last read
+        again = self.client.get(
+            url, {"page_size": 1}, HTTP_IF_MODIFIED_SINCE=http_date(time.time())
+        )
+        self.assertEqual(again.status_code, 200)
+        self.assertNotEqual(again["ETag"], response["ETag"])
+
+    @override_settings(CARD_CACHE_TIMEOUT=300)
+    def test_renaming_the_creator_changes_etags(self):
+        for i, url in enumerate([self.detail_url, reverse("cards-list")]):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                with self.captureOnCommitCallbacks(execute=True):
+                    user = User.objects.get(pk=self.user.pk)
+                    user.username = f"renamed-{i}"
+                    user.save()
+                again = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(again.status_code, 200)
+                self.assertEqual(again["X-Cache"], "MISS")
+                self.assertIn(user.username, again.content.decode())
+
+    def test_styles_list_only_has_the_cards_styles(self):
+        make_cards(self.user, 1, styles_per_card=5)
+        response = self.client.get(reverse("card-styles", args=[self.card.pk]))
+        self.assertEqual(response.data["count"], 2)
+
+
+@override_settings(AUTH_TOKEN_CACHE_TIMEOUT=300)
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("writer", password="secret-password")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_token_lookup_is_cached(self):
+        self.client.get(reverse("followers"))
+        # just the followers count (there are none); no token lookup
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("followers"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout_forgets_token(self):
+        self.client.get(reverse("followers"))
+        response = self.client.post("/api/auth/token/logout/")
+        self.assertEqual(response.status_code, 204)
+        response = self.client.get(reverse("followers"))
+        self.assertEqual(response.status_code, 401)
+
+    def test_deactivating_user_forgets_token(self):
+        self.client.get(reverse("followers"))
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse("followers"))
+        self.assertEqual(response.status_code, 401)
+
+    def test_cache_holds_only_the_user_id_and_active_flag(self):
+        self.client.get(reverse("followers"))
+        self.assertEqual(
+            cache.get(token_cache_key(self.token.key)), (self.user.pk, True)
+        )
+
+    @override_settings(AUTH_TOKEN_CACHE_TIMEOUT=0)
+    def test_not_cached_when_turned_off(self):
+        self.client.get(reverse("followers"))
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
+
+    def test_invalid_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token not-a-real-token")
+        response = self.client.get(reverse("followers"))
+        self.assertEqual(response.status_code, 401)
+
+
+class UserCounterTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user("alice")
+        self.bob = User.objects.create_user("bob")
+
+    def counts(self, user):
+        user.refresh_from_db()
+        return (user.follower_count, user.following_count, user.card_count)
+
+    def test_follow_block_unfollow(self):
+        self.alice.follow_another_user(self.bob)
+        self.alice.follow_another_user(self.bob)
+        self.assertEqual(self.counts(self.alice), (0, 1, 0))
+        self.assertEqual(self.counts(self.bob), (1, 0, 0))
+        self.bob.block_follower(self.alice)
+        self.bob.block_follower(self.alice)
+        self.assertEqual(self.counts(self.alice), (0, 0, 0))
+        self.assertEqual(self.counts(self.bob), (0, 0, 0))
+        self.bob.unblock_follower(self.alice)
+        self.assertEqual(self.counts(self.bob), (1, 0, 0))
+        self.alice.unfollow_another_user(self.bob)
+        self.assertEqual(self.counts(self.alice), (0, 0, 0))
+        self.assertEqual(self.counts(self.bob), (0, 0, 0))
+
+    def test_unfollowing_a_blocked_follow(self):
+        self.alice.follow_another_user(self.bob)
+        self.bob.block_follower(self.alice)
+        self.alice.unfollow_another_user(self.bob)
+        self.assertEqual(self.counts(self.bob), (0, 0, 0))
+
+    def test_drifted_counters_stop_at_zero(self):
+        self.alice.follow_another_user(self.bob)
+        Card.objects.create(creator=self.bob, front_text="hi")
+        User.objects.update(follower_count=0, following_count=0, card_count=0)
+        self.alice.unfollow_another_user(self.bob)
+        Card.objects.filter(creator=self.bob).delete()
+        self.assertEqual(self.counts(self.alice), (0, 0, 0))
+        self.assertEqual(self.counts(self.bob), (0, 0, 0))
+
+    def test_follow_and_unfollow_endpoints(self):
+        self.client.force_authenticate(self.alice)
+        self.client.post(reverse("follows"), {"followed_user": self.bob.pk})
+        self.assertEqual(self.counts(self.bob), (1, 0, 0))
+        self.client.delete(reverse("unfollow", args=[self.bob.pk]))
+        self.assertEqual(self.counts(self.bob), (0, 0, 0))
+
+    def test_published_cards_are_counted(self):
+        card = Card.objects.create(creator=self.alice, front_text="hi")
+        draft = Card.objects.create(creator=self.alice, front_text="wip", draft=True)
+        self.assertEqual(self.counts(self.alice), (0, 0, 1))
+        draft.draft = False
+        draft.save()
+        self.assertEqual(self.counts(self.alice), (0, 0, 2))
+        card.draft = True
+        card.save()
+        self.assertEqual(self.counts(self.alice), (0, 0, 1))
+        draft.delete()
+        card.delete()
+        self.assertEqual(self.counts(self.alice), (0, 0, 0))
+
+    def test_profile_endpoint(self):
+        self.alice.follow_another_user(self.bob)
+        Card.objects.create(creator=self.bob, front_text="hi")
+        self.client.force_authenticate(self.alice)
+        response = self.client.get(reverse("user-profile", args=[self.bob.pk]))
+        self.assertEqual(
+            response.data,
+            {
+                "id": self.bob.pk,
+                "username": "bob",
+                "follower_count": 1,
+                "following_count": 0,
+                "card_count": 1,
+            },
+        )
+
+    def test_reconcile_counters(self):
+        self.alice.follow_another_user(self.bob)
+        Card.objects.create(creator=self.bob, front_text="hi")
+        User.objects.update(follower_count=7, card_count=0)
+        out = io.StringIO()
+        call_command("reconcile_counters", stdout=out)
+        self.assertIn("follower_count: corrected 2 users", out.getvalue())
+        self.assertEqual(self.counts(self.alice), (0, 1, 0))
+        self.assertEqual(self.counts(self.bob), (1, 0, 1))
+
+
+class BulkFollowTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("joiner")
+        self.others = [User.objects.create_user(f"suggested{i}") for i in range(30)]
+        self.client.force_authenticate(self.user)
+
+    def bulk(self, name, user_ids):
+        response = self.client.post(
+            reverse(name), {"user_ids": user_ids}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return {row["user_id"]: row["result"] for row in response.data["results"]}
+
+    def test_bulk_follow_outcomes(self):
+        first, second = self.others[:2]
+        self.user.follow_another_user(first)
+        outcomes = self.bulk(
+            "follows-bulk", [first.pk, second.pk, second.pk, self.user.pk, 999999]
+        )
+        self.assertEqual(
+            outcomes,
+            {
+                first.pk: "already_following",
+                second.pk: "followed",
+                self.user.pk: "cannot_follow_self",
+                999999: "not_found",
+            },
+        )
+        self.assertTrue(self.user.followed_users.filter(pk=second.pk).exists())
+        self.user.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(self.user.following_count, 2)
+        self.assertEqual(second.follower_count, 1)
+
+    def test_query_count_does_not_grow(self):
+        ids = [user.pk for user in self.others]
+        with CaptureQueriesContext(connection) as few:
+            self.bulk("follows-bulk", ids[:2])
+        with CaptureQueriesContext(connection) as many:
+            self.bulk("follows-bulk", ids[2:])
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(self.user.followed_users.count(), 30)
+
+    def test_bulk_unfollow(self):
+        followed, blocked, stranger = self.others[:3]
+        self.user.follow_another_user(followed)
+        self.user.follow_another_user(blocked)
+        blocked.block_follower(self.user)
+        outcomes = self.bulk("unfollow-bulk", [followed.pk, blocked.pk, stranger.pk])
+        self.assertEqual(
+            outcomes,
+            {
+                followed.pk: "unfollowed",
+                blocked.pk: "unfollowed",
+                stranger.pk: "not_following",
+            },
+        )
+        self.assertFalse(FollowRelationship.objects.exists())
+        self.assertEqual(
+            reconcile_counters(),
+            {"follower_count": 0, "following_count": 0, "card_count": 0},
+        )
+
+    def test_follows_made_since_the_check_are_not_counted_twice(self):
+        first, second = self.others[:2]
+        insert_follows = follows._insert_follows
+
+        def race(follower_id, user_ids):
+            # another request follows `first` between the check and the insert
+            self.user.follow_another_user(first)
+            return insert_follows(follower_id, user_ids)
+
+        with mock.patch.object(follows, "_insert_follows", race):
+            outcomes = self.bulk("follows-bulk", [first.pk, second.pk])
+        self.assertEqual(
+            outcomes, {first.pk: "already_following", second.pk: "followed"}
+        )
+        self.assertEqual(
+            reconcile_counters(),
+            {"follower_count": 0, "following_count": 0, "card_count": 0},
+        )
+
+    def test_rejects_bad_payloads(self):
+        for payload in ({}, {"user_ids": []}, {"user_ids": list(range(101))}):
+            response = self.client.post(reverse("follows-bulk"), payload, format="json")
+            self.assertEqual(response.status_code, 400)
+
+    def test_single_follow_twice(self):
+        other = self.others[0]
+        self.client.post(reverse("follows"), {"followed_user": other.pk})
+        response = self.client.post(reverse("follows"), {"followed_user": other.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, ["You already follow this user."])
+
+
+@override_settings(FEED_MODE="hybrid")
+class BulkFollowFeedTests(APITestCase):
+    def test_bulk_follow_and_unfollow_update_feed(self):
+        reader = User.objects.create_user("reader")
+        writers = [User.objects.create_user(f"writer{i}") for i in range(3)]
+        for writer in writers:
+            make_cards(writer, 2)
+        follow_users(reader, [writer.pk for writer in writers])
+        self.assertEqual(FeedEntry.objects.filter(user=reader).count(), 6)
+        unfollow_users(reader, [writers[0].pk])
+        self.assertEqual(FeedEntry.objects.filter(user=reader).count(), 4)
+
+
+class RelationshipHelperTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob, cls.carol, cls.dave = [
+            User.objects.create_user(name) for name in ("alice", "bob", "carol", "dave")
+        ]
+        # alice <-> bob are mutuals, carol follows alice, alice follows dave
+        # but dave has blocked her
+        cls.alice.follow_another_user(cls.bob)
+        cls.bob.follow_another_user(cls.alice)
+        cls.carol.follow_another_user(cls.alice)
+        cls.alice.follow_another_user(cls.dave)
+        cls.dave.block_follower(cls.alice)
+
+    def test_relationship_querysets(self):
+        alice = self.alice
+        self.assertEqual(
+            {r.followed_user for r in alice.get_relationships_where_follower()},
+            {self.bob},
+        )
+        self.assertEqual(
+            {r.follower for r in alice.get_relationships_where_followed()},
+            {self.bob, self.carol},
+        )
+        self.assertEqual(list(alice.get_users_blocking_me()), [self.dave])
+        self.assertEqual(list(self.dave.get_blocked_followers()), [alice])
+        self.assertEqual(list(alice.get_mutuals()), [self.bob])
+
+    def test_single_query_checks(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.alice.is_blocked_by(self.dave))
+        self.assertFalse(self.alice.is_blocked_by(self.bob))
+        self.assertTrue(self.alice.follows(self.bob))
+        self.assertFalse(self.alice.follows(self.dave))
+        self.assertTrue(self.alice.is_followed_by(self.carol))
+        self.assertFalse(self.carol.is_followed_by(self.alice))
+
+    def test_follower_lists_carry_follow_flags(self):
+        self.client.force_authenticate(self.alice)
+        # count and page; flags come from subqueries, not per-row lookups
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("followers"))
+        rows = {row["username"]: row for row in response.data["results"]}
+        self.assertEqual(set(rows), {"bob", "carol"})
+        self.assertTrue(rows["bob"]["followed_by_me"])
+        self.assertFalse(rows["carol"]["followed_by_me"])
+        self.assertTrue(rows["carol"]["follows_me"])
+        self.assertIsNotNone(rows["carol"]["relationship_created"])
+
+        response = self.client.get(reverse("followed"))
+        self.assertEqual([row["username"] for row in response.data["results"]], ["bob"])
+        self.assertTrue(response.data["results"][0]["follows_me"])
+
+
+class FollowSuggestionTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            name: User.objects.create_user(name)
+            for name in ("me", "a", "b", "x", "y", "z", "q")
+        }
+        u = cls.users
+        for follower, followed in [
+            ("me", "a"),
+            ("me", "b"),
+            ("me", "y"),
+            ("a", "x"),
+            ("a", "y"),
+            ("a", "z"),
+            ("a", "q"),
+            ("b", "x"),
+            ("b", "a"),
+            ("q", "me"),
+        ]:
+            u[follower].follow_another_user(u[followed])
+        # y has blocked me and I have blocked q
+        u["y"].block_follower(u["me"])
+        u["me"].block_follower(u["q"])
+
+    def setUp(self):
+        self.client.force_authenticate(self.users["me"])
+
+    def suggested(self):
+        response = self.client.get(reverse("suggestions"))
+        return [(row["username"], row["score"]) for row in response.data["results"]]
+
+    def test_ranked_by_shared_follows_excluding_followed_and_blocked(self):
+        list(refresh_suggestions(batch_size=2))
+        self.assertEqual(self.suggested(), [("x", 2), ("z", 1)])
+
+    def test_followed_since_refresh_are_hidden(self):
+        list(refresh_suggestions())
+        self.users["me"].follow_another_user(self.users["x"])
+        self.assertEqual(self.suggested(), [("z", 1)])
+
+    def test_incremental_refresh(self):
+        list(refresh_suggestions())
+        since = FollowRelationship.objects.latest("created_at").created_at
+        newcomer = User.objects.create_user("newcomer")
+        self.users["b"].follow_another_user(newcomer)
+        affected = users_affected_since(since)
+        self.assertIn(self.users["me"], affected)
+        self.assertNotIn(self.users["x"], affected)
+
+        out = io.StringIO()
+        call_command("refresh_suggestions", since=since.isoformat(), stdout=out)
+        self.assertIn(("newcomer", 1), self.suggested())
+
+    def test_invalid_since_fails_the_command(self):
+        for since in ("yesterday", "2024-13-01T00:00"):
+            with self.subTest(since=since), self.assertRaises(CommandError):
+                call_command("refresh_suggestions", since=since, stdout=io.StringIO())
+
+
+# URLconf with the async read views in front, as when ASYNC_READ_VIEWS is on
+urlpatterns = [
+    path("api/", include(api_urls.async_read_urlpatterns + api_urls.urlpatterns))
+]
+
+
+class AsyncReadViewTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user("reader")
+        cls.writer = User.objects.create_user("writer")
+        cls.reader.follow_another_user(cls.writer)
+        cls.writer.follow_another_user(cls.reader)
+        cls.cards = make_cards(cls.writer, 3)
+        cls.auth = f"Token {Token.objects.create(user=cls.reader).key}"
+
+    def setUp(self):
+        cache.clear()
+
+    def async_request(self, method, url, **kwargs):
+        with override_settings(ROOT_URLCONF="api.tests"):
+            return async_to_sync(getattr(self.async_client, method))(url, **kwargs)
+
+    def test_routes_to_async_views(self):
+        with override_settings(ROOT_URLCONF="api.tests"):
+            self.assertIs(resolve("/api/cards/").func, async_views.card_list)
+            self.assertIs(resolve("/api/feed/").func, async_views.feed)
+
+    def test_responses_match_sync_views(self):
+        urls = [
+            reverse("cards-list"),
+            reverse("cards-detail", args=[self.cards[0].pk]),
+            reverse("feed"),
+            reverse("followers"),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                expected = self.client.get(url, HTTP_AUTHORIZATION=self.auth)
+                response = self.async_request(
+                    "get", url, headers={"Authorization": self.auth}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), expected.json())
+                self.assertEqual(response.get("ETag"), expected.get("ETag"))
+                # queries run in sync_to_async threads are still counted
+                self.assertNotIn('desc="0 queries"', response["Server-Timing"])
+
+    def test_other_formats_use_sync_views(self):
+        urls = [
+            reverse("cards-list"),
+            reverse("cards-detail", args=[self.cards[0].pk]),
+            reverse("feed"),
+            reverse("followers"),
+        ]
+        requests = [
+            ({"format": "api"}, {}),
+            ({}, {"Accept": "text/html"}),
+            ({}, {"Accept": "application/xml"}),
+        ]
+        for url in urls:
+            for data, headers in requests:
+                with self.subTest(url=url, data=data, headers=headers):
+                    expected = self.client.get(
+                        url,
+                        data,
+                        HTTP_AUTHORIZATION=self.auth,
+                        **{f"HTTP_{k.upper()}": v for k, v in headers.items()},
+                    )
+                    response = self.async_request(
+                        "get",
+                        url,
+                        data=data,
+                        headers={"Authorization": self.auth, **headers},
+                    )
+                    self.assertEqual(response.status_code, expected.status_code)
+                    self.assertEqual(response["Content-Type"], expected["Content-Type"])
+
+    @override_settings(CARD_CACHE_TIMEOUT=300)
+    def test_anonymous_reads_share_the_response_cache(self):
+        url = reverse("cards-list")
+        etag = self.client.get(url)["ETag"]
+        response = self.async_request("get", url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response["ETag"], etag)
+        response = self.async_request("get", url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_other_requests_use_sync_views(self):
+        self.assertEqual(self.async_request("get", reverse("feed")).status_code, 401)
+        self.assertEqual(
+            self.async_request(
+                "get", reverse("feed"), headers={"Authorization": "Token nope"}
+            ).status_code,
+            401,
+        )
+        self.assertEqual(
+            self.async_request("get", reverse("cards-detail", args=[0])).status_code,
+            404,
+        )
+        response = self.async_request(
+            "get", reverse("cards-list"), data={"search": "card"}
+        )
+        self.assertEqual(response.json()["count"], 3)
+        response = self.async_request(
+            "post",
+            reverse("cards-list"),
+            data={"front_text": "async"},
+            content_type="application/json",
+            headers={"Authorization": self.auth},
+        )
+        self.assertEqual(response.status_code, 201)
+
+
+class PersistentConnectionTests(SimpleTestCase):
+    databases = {DEFAULT_DB_ALIAS}
+
+    def setUp(self):
+        # a connection of our own, outside the test case's transaction
+        self.db = connections.create_connection(DEFAULT_DB_ALIAS)
+        self.db.settings_dict = {**self.db.settings_dict}
+        if self.db.vendor == "sqlite":
+            # in-memory SQLite connections are never closed, so use a file
+            tmp = tempfile.TemporaryDirectory()
+            self.addCleanup(tmp.cleanup)
+            self.db.settings_dict["NAME"] = os.path.join(tmp.name, "db.sqlite3")
+        self.addCleanup(self.db.close)
+
+    def request(self):
+        """Run a query the way a request does, closing stale connections around it."""
+        self.db.close_if_unusable_or_obsolete()
+        with self.db.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        self.db.close_if_unusable_or_obsolete()
+        return self.db.connection
+
+    def test_connection_is_reused_across_requests(self):
+        first = self.request()
+        self.assertIsNotNone(first)
+        self.assertIs(self.request(), first)
+
+    def test_connection_is_closed_after_max_age(self):
+        first = self.request()
+        self.db.close_at = 0
+        self.assertIsNot(self.request(), first)
+
+    def test_broken_connection_is_replaced_after_error(self):
+        first = self.request()
+        with self.assertRaises(DatabaseError):
+            with self.db.cursor() as cursor:
+                cursor.execute("SELECT * FROM no_such_table")
+        # SQLite connections stay usable, so stand in for a dropped server connection
+        with mock.patch.object(self.db, "is_usable", return_value=False):
+            self.db.close_if_unusable_or_obsolete()
+        self.assertIsNone(self.db.connection)
+        self.assertIsNot(self.request(), first)
+
+    def test_health_check_replaces_dead_connection_before_reuse(self):
+        first = self.request()
+        with mock.patch.object(self.db, "is_usable", return_value=False):
+            self.assertIsNot(self.request(), first)
+
+
+class RequestMetricsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("measured")
+        make_cards(cls.user, 3)
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("cards-list"))
+        timings = dict(
+            entry.split(";", 1)[0:2] for entry in response["Server-Timing"].split(", ")
+        )
+        self.assertEqual(set(timings), {"db", "app", "serialize", "render", "total"})
+        # count, page of cards, styles
+        self.assertIn('desc="3 queries"', timings["db"])
+
+    def test_serialization_is_timed_separately(self):
+        def slowly(function):
+            def slow(*args, **kwargs):
+                time.sleep(0.005)
+                return function(*args, **kwargs)
+
+            return slow
+
+        patches = {
+            True: mock.patch("api.fastpath.represent", slowly(represent)),
+            False: mock.patch.object(
+                CardSerializer,
+                "to_representation",
+                slowly(CardSerializer.to_representation),
+            ),
+        }
+        for fast, patch in patches.items():
+            with self.subTest(fast=fast), self.settings(
+                CARD_FAST_SERIALIZATION=fast
+            ), patch:
+                response = self.client.get(reverse("cards-list"))
+                timings = dict(
+                    entry.split(";dur=")
+                    for entry in response["Server-Timing"].split(", ")
+                )
+                # three cards, or their six styles on the fast path
+                self.assertGreaterEqual(float(timings["serialize"]), 10)
+                self.assertLess(float(timings["app"]), float(timings["serialize"]))
+        self.assertIn(
+            'cards_serialize_duration_seconds_total{view="cards-list"}',
+            registry.render(),
+        )
+
+    @override_settings(SERVER_TIMING=False)
+    def test_server_timing_can_be_turned_off(self):
+        self.assertNotIn("Server-Timing", self.client.get(reverse("cards-list")))
+
+    @override_settings(METRICS_TOKEN="scrape")
+    @override_settings(CARD_CACHE_TIMEOUT=300)
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("cards-list"))
+        self.client.get(reverse("cards-list"))
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+
+        response = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn(
+            'cards_http_requests_total{view="cards-list",method="GET",status="200"} 2',
+            body,
+        )
+        # the second read was a response cache hit, with no queries
+        self.assertIn('cards_db_queries_total{view="cards-list"} 3', body)
+        self.assertIn(
+            'cards_http_request_duration_seconds_count{view="cards-list"} 2', body
+        )
+        self.assertIn('cards_response_cache_requests_total{result="hit"} 1', body)
+
+    def test_metrics_endpoint_disabled_without_token(self):
+        response = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer anything"
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_traces_sampler_rates_by_url_name(self):
+        sampler = traces_sampler(0.1, {"cards-list": 0.01})
+        environ = {"PATH_INFO": reverse("cards-list")}
+        self.assertEqual(sampler({"wsgi_environ": environ}), 0.01)
+        scope = {"path": reverse("feed")}
+        self.assertEqual(sampler({"asgi_scope": scope}), 0.1)
+        self.assertEqual(sampler({"wsgi_environ": {"PATH_INFO": "/nope"}}), 0.1)
+        self.assertTrue(sampler({"parent_sampled": True, "wsgi_environ": environ}))
+
+
+class BenchmarkCommandTests(APITestCase):
+    def test_seeds_measures_and_compares(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            report_path = os.path.join(tmp, "report.json")
+            options = {"samples": 2, "warmup": 0, "stdout": io.StringIO()}
+            call_command(
+                "benchmark_api",
+                seed=True,
+                users=30,
+                cards_per_user=2,
+                output=report_path,
+                **options,
+            )
+            with open(report_path) as report_file:
+                report = json.load(report_file)
+            self.assertEqual(report["meta"]["users"], 30)
+            self.assertEqual(report["routes"]["GET cards-list"]["statuses"], [200])
+            # token lookup (not cached without a shared cache), count, page, styles
+            self.assertEqual(report["routes"]["GET cards-list"]["queries"], 4)
+            # writes are rolled back
+            self.assertEqual(report["meta"]["cards"], Card.objects.count())
+
+            out = io.StringIO()
+            call_command(
+                "benchmark_api", compare=report_path, **{**options, "stdout": out}
+            )
+            self.assertIn("GET feed", out.getvalue().split("Compared with")[1])
+
+
+class SeedCommandTests(APITestCase):
+    options = {
+        "users": 40,
+        "follows_per_user": 5,
+        "cards_per_user": 2,
+        "styles_per_card": (1, 4),
+        "batch_size": 25,
+    }
+
+    def seed(self, **options):
+        call_command("seed", stdout=io.StringIO(), **{**self.options, **options})
+
+    def follows(self):
+        return sorted(
+            FollowRelationship.objects.values_list(
+                "follower__username", "followed_user__username"
+            )
+        )
+
+    def test_seeds_the_requested_scale(self):
+        self.seed()
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Card.objects.count(), 80)
+        per_card = Card.objects.annotate(n=Count("styles")).values_list("n", flat=True)
+        self.assertTrue(all(1 <= n <= 4 for n in per_card))
+        self.assertGreater(FollowRelationship.objects.count(), 100)
+        # counters are reconciled and cards are searchable
+        self.assertEqual(set(reconcile_counters().values()), {0})
+        card = Card.objects.filter(draft=False).first()
+        response = self.client.get(
+            reverse("cards-list"), {"search": card.creator.username}
+        )
+        self.assertGreater(response.data["count"], 0)
+
+    def test_same_seed_same_data(self):
+        self.seed()
+        first = self.follows()
+        self.seed(flush=True)
+        self.assertEqual(self.follows(), first)
+        self.seed(flush=True, random_seed=1)
+        self.assertNotEqual(self.follows(), first)
+
+    def test_flush_removes_seeded_data_only(self):
+        self.seed()
+        user = User.objects.create_user(username="real", password="x")
+        make_cards(user, 1)
+        seeded = User.objects.get(username="seed-0")
+        user.follow_another_user(seeded)
+        self.seed(flush=True, users=0, follows_per_user=0, cards_per_user=0)
+        self.assertEqual(list(User.objects.all()), [user])
+        self.assertEqual(Card.objects.count(), 1)
+        self.assertFalse(FollowRelationship.objects.exists())
+        user.refresh_from_db()
+        self.assertEqual(user.following_count, 0)
+
+    def test_rejects_bad_style_range(self):
+        with self.assertRaises(CommandError):
+            call_command("seed", "--styles-per-card", "4-1", stdout=io.StringIO())
+
+
+class FastJSONTests(APITestCase):
+    def test_renders_like_drf(self):
+        data = {
+            "created_at": datetime.datetime(
+                2023, 9, 21, 18, 48, 5, 123456, tzinfo=datetime.timezone.utc
+            ),
+            "local": datetime.datetime(2023, 9, 21, 18, 48),
+            "day": datetime.date(2023, 9, 21),
+            "price": decimal.Decimal("1.50"),
+            "label": gettext_lazy("Active"),
+            "id": uuid.UUID(int=1),
+            "text": "Grüße \u2028 🎉",
+            1: ["nested", (1, 2.5, None, True)],
+            "huge": 2**70,
+        }
+        rendered = FastJSONRenderer().render(data)
+        self.assertEqual(rendered, JSONRenderer().render(data))
+        self.assertIn(b'"2023-09-21T18:48:05.123456Z"', rendered)
+        # indented output comes from the stdlib renderer
+        self.assertEqual(
+            FastJSONRenderer().render(data, "application/json; indent=4"),
+            JSONRenderer().render(data, "application/json; indent=4"),
+        )
+
+    def test_api_responses_and_requests(self):
+        user = User.objects.create_user(username="alice", password="x")
+        make_cards(user, 2)
+        response = self.client.get(reverse("cards-list"))
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+        self.client.force_authenticate(user)
+        response = self.client.post(
+            reverse("cards-list"),
+            '{"front_text": "Grüße", "back_text": "x"}'.encode(),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["front_text"], "Grüße")
+        response = self.client.post(
+            reverse("cards-list"),
+            '{"front_text": NaN}',
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("JSON parse error", response.data["detail"])
+
+
+class FastCardSerializationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username="alice", password="x")
+        cls.bob = User.objects.create_user(username="bob", password="x")
+        cls.bob.follow_another_user(cls.alice)
+        make_cards(cls.alice, 12, styles_per_card=3)
+        make_cards(cls.bob, 2, styles_per_card=0, draft=True)
+        Card.objects.create(
+            creator=cls.alice,
+            front_text="Grüße   🎉",
+            back_text=None,
+            imageURL="https://example.com/card.png",
+        )
+        CardStyleDeclaration.objects.create(
+            card=Card.objects.latest("pk"), property="italic", boolValue=False
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def assertSameResponse(self, path, user=None, **params):
+        self.client.force_authenticate(user)
+        with override_settings(CARD_FAST_SERIALIZATION=False):
+            expected = self.client.get(path, params)
+        cache.clear()
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        return response
+
+    def test_matches_card_serializer(self):
+        card = Card.objects.filter(draft=False).latest("pk")
+        for path, user, params in (
+            (reverse("cards-list"), None, {}),
+            (reverse("cards-list"), self.bob, {"page": 2}),
+            (reverse("cards-list"), None, {"pagination": "cursor"}),
+            (reverse("cards-list"), None, {"search": "alice"}),
+            (reverse("cards-detail", args=[card.pk]), None, {}),
+            (reverse("cards-me"), self.bob, {"draft": "true"}),
+            (reverse("feed"), self.bob, {}),
+        ):
+            with self.subTest(path=path, params=params):
+                response = self.assertSameResponse(path, user, **params)
+                self.assertEqual(response.status_code, 200)
+
+    def test_missing_cards_are_404s(self):
+        draft = Card.objects.filter(draft=True).first()
+        for pk in (draft.pk, 999999):
+            response = self.assertSameResponse(reverse("cards-detail", args=[pk]))
+            self.assertEqual(response.status_code, 404)
+
+    def test_runs_fewer_queries_per_page(self):
+        self.client.force_authenticate(self.bob)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("cards-list"))
+        # COUNT(*), page of card rows, styles of the page
+        self.assertEqual(len(queries), 3)
+
+    def test_async_views_match(self):
+        card = Card.objects.filter(draft=False).latest("pk")
+        headers = {"Authorization": f"Token {Token.objects.create(user=self.bob).key}"}
+        for path in ("/api/cards/", f"/api/cards/{card.pk}/", "/api/feed/"):
+            with self.subTest(path=path):
+                with override_settings(CARD_FAST_SERIALIZATION=False):
+                    expected = self.client.get(path, headers=headers)
+                with override_settings(ROOT_URLCONF="api.tests"):
+                    response = async_to_sync(self.async_client.get)(
+                        path, headers=headers
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+
+
+class SparseFieldsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username="alice", password="x")
+        cls.bob = User.objects.create_user(username="bob", password="x")
+        cls.bob.follow_another_user(cls.alice)
+        cls.cards = make_cards(cls.alice, 3, styles_per_card=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, path, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params)
+        return response, " ".join(query["sql"] for query in queries)
+
+    def test_fields_and_omit(self):
+        for fast in (True, False):
+            with self.subTest(fast=fast), override_settings(
+                CARD_FAST_SERIALIZATION=fast
+            ):
+                cache.clear()
+                response, sql = self.get(
+                    reverse("cards-list"), fields="front_text, id,background_color"
+                )
+                self.assertEqual(
+                    list(response.data["results"][0]),
+                    ["id", "front_text", "background_color"],
+                )
+                self.assertNotIn("back_text", sql)
+                self.assertNotIn("api_cardstyledeclaration", sql)
+                self.assertNotIn("api_user", sql)
+
+                response, sql = self.get(
+                    reverse("cards-list"), fields="id,creator,styles", omit="id"
+                )
+                card = response.data["results"][0]
+                self.assertEqual(list(card), ["creator", "styles"])
+                self.assertEqual(card["creator"], "alice")
+                self.assertEqual(len(card["styles"]), 2)
+
+                response, sql = self.get(reverse("cards-list"), omit="styles")
+                self.assertNotIn("styles", response.data["results"][0])
+                self.assertIn("creator_id", response.data["results"][0])
+                self.assertNotIn("api_cardstyledeclaration", sql)
+
+    def test_detail_feed_and_cursor_pages(self):
+        card = self.cards[0]
+        response, _ = self.get(reverse("cards-detail", args=[card.pk]), fields="id")
+        self.assertEqual(response.data, {"id": card.pk})
+        response, _ = self.get(
+            reverse("cards-list"), fields="id", pagination="cursor", page_size=2
+        )
+        response, _ = self.get(response.data["next"])
+        self.assertEqual(response.data["results"], [{"id": self.cards[0].pk}])
+
+        self.client.force_authenticate(self.bob)
+        response, _ = self.get(reverse("feed"), omit="styles,creator")
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertNotIn("creator", response.data["results"][0])
+
+    def test_unknown_fields(self):
+        response, _ = self.get(reverse("cards-list"), fields="id,secret")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"fields": ["Unknown fields: secret."]})
+
+    def test_writes_return_every_field(self):
+        self.client.force_authenticate(self.alice)
+        response = self.client.patch(
+            reverse("cards-detail", args=[self.cards[0].pk]) + "?fields=id",
+            {"front_text": "Edited"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["front_text"], "Edited")
+        self.assertIn("styles", response.data)
+
+    def test_async_views_leave_sparse_reads_to_sync_views(self):
+        with override_settings(ROOT_URLCONF="api.tests"):
+            response = async_to_sync(self.async_client.get)(
+                "/api/cards/", {"fields": "id"}
+            )
+        self.assertEqual(
+            response.json()["results"], [{"id": card.pk} for card in self.cards[::-1]]
+        )
+
+
+class CompactStyleStorageTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username="alice", password="x")
+        cls.bob = User.objects.create_user(username="bob", password="x")
+        cls.bob.follow_another_user(cls.alice)
+        cls.cards = make_cards(cls.alice, 4, styles_per_card=3)
+        with cls.captureOnCommitCallbacks(execute=True):
+            CardStyleDeclaration.objects.create(
+                card=cls.cards[0], property="italic", boolValue=True
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def assertInSync(self, card):
+        card.refresh_from_db()
+        styles = [
+            list(style)
+            for style in card.styles.order_by("property").values_list(
+                "property", "value", "boolValue"
+            )
+        ]
+        self.assertEqual(card.compact_styles, styles)
+
+    def test_responses_match_rows_mode(self):
+        card = self.cards[0]
+        for path, user, params in (
+            (reverse("cards-list"), None, {}),
+            (reverse("cards-list"), None, {"fields": "id,styles"}),
+            (reverse("cards-detail", args=[card.pk]), None, {}),
+            (reverse("cards-me"), self.alice, {}),
+            (reverse("feed"), self.bob, {}),
+        ):
+            for fast in (True, False):
+                with self.subTest(path=path, params=params, fast=fast):
+                    self.client.force_authenticate(user)
+                    with override_settings(CARD_FAST_SERIALIZATION=fast):
+                        expected = self.client.get(path, params)
+                        cache.clear()
+                        with override_settings(CARD_STYLE_STORAGE="compact"):
+                            response = self.client.get(path, params)
+                        cache.clear()
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.content, expected.content)
+
+    def test_async_views_match(self):
+        headers = {"Authorization": f"Token {Token.objects.create(user=self.bob).key}"}
+        for path in ("/api/cards/", f"/api/cards/{self.cards[0].pk}/"):
+            expected = self.client.get(path, headers=headers)
+            for fast in (True, False):
+                with self.subTest(path=path, fast=fast), override_settings(
+                    ROOT_URLCONF="api.tests",
+                    CARD_FAST_SERIALIZATION=fast,
+                    CARD_STYLE_STORAGE="compact",
+                ):
+                    cache.clear()
+                    response = async_to_sync(self.async_client.get)(
+                        path, headers=headers
+                    )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.content, expected.content)
+
+    def test_styles_cost_no_extra_query(self):
+        def queries(path, user, storage):
+            self.client.force_authenticate(user)
+            with override_settings(CARD_STYLE_STORAGE=storage):
+                with CaptureQueriesContext(connection) as captured:
+                    response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            return [query["sql"] for query in captured]
+
+        for path, user in (
+            (reverse("cards-list"), None),
+            (reverse("cards-detail", args=[self.cards[0].pk]), None),
+            (reverse("cards-me"), self.alice),
+            (reverse("feed"), self.bob),
+        ):
+            for fast in (True, False):
+                with self.subTest(path=path, fast=fast), override_settings(
+                    CARD_FAST_SERIALIZATION=fast
+                ):
+                    rows = queries(path, user, "rows")
+                    compact = queries(path, user, "compact")
+                    # the same queries minus the styles one, with the
+                    # presets joined into the card query
+                    self.assertEqual(len(compact), len(rows) - 1)
+                    self.assertNotIn("api_cardstyledeclaration", " ".join(compact))
+
+    def test_style_writes_keep_the_copy_in_sync(self):
+        card = self.cards[1]
+        self.client.force_authenticate(self.alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("card-styles", args=[card.pk]),
+                {"property": "color", "value": "red"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertInSync(card)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse("card-style-edit", args=[card.pk]),
+                [
+                    {"property": "color", "boolValue": False},
+                    {"property": "shadow", "boolValue": True},
+                ],
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertInSync(card)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            card.styles.get(property="prop-0").delete()
+        self.assertInSync(card)
+        self.assertEqual(len(card.compact_styles), 4)
+
+    def test_batched_changes_sync_once(self):
+        card = self.cards[2]
+        with mock.patch(
+            "api.styles.sync_compact_styles", wraps=sync_compact_styles
+        ) as sync, self.captureOnCommitCallbacks(execute=True):
+            with batched_style_changes():
+                card.styles.all().delete()
+                with batched_style_changes():
+                    CardStyleDeclaration.objects.create(
+                        card=card, property="a", value="b"
+                    )
+                # nothing is synced before the block ends
+                sync.assert_not_called()
+        sync.assert_called_once_with({card.pk}, touch=True)
+        self.assertInSync(card)
+
+    def test_style_requests_sync_once(self):
+        card = self.cards[2]
+        self.client.force_authenticate(self.alice)
+        with mock.patch(
+            "api.styles.sync_compact_styles", wraps=sync_compact_styles
+        ) as sync, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("card-styles", args=[card.pk]),
+                [{"property": "a", "value": "b"}, {"property": "c", "value": "d"}],
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+        sync.assert_called_once_with({card.pk}, touch=True)
+        self.assertInSync(card)
+
+    def test_deleting_a_card_skips_syncing_its_styles(self):
+        card = make_cards(self.alice, 1, styles_per_card=10)[0]
+        with mock.patch(
+            "api.styles.sync_compact_styles"
+        ) as sync, self.captureOnCommitCallbacks(execute=True):
+            card.delete()
+        sync.assert_not_called()
+
+    def test_cards_that_look_the_same_share_a_preset(self):
+        self.client.force_authenticate(self.bob)
+        look = {"background_color": "red", "font": "serif", "text_align": "left"}
+        ids = [
+            self.client.post(
+                reverse("cards-list"), {"front_text": "hi", **look}, format="json"
+            ).data["id"]
+            for _ in range(2)
+        ]
+        first, second = Card.objects.filter(pk__in=ids)
+        self.assertEqual(first.preset_id, second.preset_id)
+        self.assertEqual(first.preset.font, "serif")
+
+        response = self.client.patch(
+            reverse("cards-detail", args=[first.pk]),
+            {"font_size": "2rem"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {field: response.data[field] for field in APPEARANCE_FIELDS},
+            {**dict.fromkeys(APPEARANCE_FIELDS), **look, "font_size": "2rem"},
+        )
+        first.refresh_from_db()
+        self.assertNotEqual(first.preset_id, second.preset_id)
+
+    def test_appearance_changes_keep_the_styles(self):
+        card = self.cards[0]
+        self.client.force_authenticate(self.alice)
+        response = self.client.patch(
+            reverse("cards-detail", args=[card.pk]),
+            {"background_color": "blue"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["styles"]), 4)
+        self.assertInSync(card)
+        self.assertEqual(card.preset.background_color, "blue")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            card.styles.get(property="italic").delete()
+        self.assertInSync(card)
+        self.assertEqual(card.preset.background_color, "blue")
+
+    def test_style_changes_keep_the_preset(self):
+        self.client.force_authenticate(self.bob)
+        response = self.client.post(
+            reverse("cards-list"),
+            {"front_text": "hi", "font": "serif"},
+            format="json",
+        )
+        card = Card.objects.get(pk=response.data["id"])
+        self.assertIsNotNone(card.preset_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("card-styles", args=[card.pk]),
+                {"property": "color", "value": "red"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Card.objects.get(pk=card.pk).preset_id, card.preset_id)
+        self.assertFalse(StylePreset.objects.filter(cards=None).exists())
+
+    def test_sync_compact_styles_command_rewrites_every_card(self):
+        Card.objects.update(compact_styles=[])
+        out = io.StringIO()
+        call_command("sync_compact_styles", stdout=out)
+        self.assertIn("Synced styles of 4 cards.", out.getvalue())
+        for card in self.cards:
+            self.assertInSync(card)
+
+    def test_prune_command_deletes_only_unused_presets(self):
+        card = self.cards[0]
+        self.client.force_authenticate(self.alice)
+        for font in ("serif", "sans-serif"):
+            response = self.client.patch(
+                reverse("cards-detail", args=[card.pk]), {"font": font}, format="json"
+            )
+            self.assertEqual(response.status_code, 200)
+        card.refresh_from_db()
+        out = io.StringIO()
+        call_command("prune_style_presets", stdout=out)
+        self.assertIn("Deleted 1 unused presets.", out.getvalue())
+        self.assertEqual(
+            list(StylePreset.objects.values_list("pk", flat=True)), [card.preset_id]
+        )
+        self.assertEqual(card.preset.font, "sans-serif")
@@ -1,17 +1,34 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from .views import CardViewSet
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from rest_framework import routers
+from . import async_views
 from .views import (
+    FeedView,
+    UserProfileView,
+    BulkFollowView,
+    BulkUnfollowView,
     FollowedUsersListView,
     FollowersListView,
+    FollowSuggestionListView,
     FollowRelationshipCreateView,
     FollowRelationshipDestroyView,
     CardStyleDeclarationListCreateView,
     CardStyleDeclarationUpdateView,
+    metrics,
 )
 
+# Async GET handlers for the hot read endpoints, for serving under ASGI. They
+# sit in front of the router and pass other methods to the regular views.
+async_read_urlpatterns = [
+    path("cards/", async_views.card_list, name="cards-list"),
+    path("cards/<int:pk>/", async_views.card_detail, name="cards-detail"),
+    path("feed/", async_views.feed, name="feed"),
+    path("users/followers", async_views.followers, name="followers"),
+]
+
 router = routers.DefaultRouter()
 router.register("cards", CardViewSet, basename="cards")
 
@@ -27,14 +44,20 @@ urlpatterns = [
         CardStyleDeclarationUpdateView.as_view(),
         name="card-style-edit",
     ),
+    path("feed/", FeedView.as_view(), name="feed"),
+    path("users/<int:pk>/", UserProfileView.as_view(), name="user-profile"),
     path("users/followed", FollowedUsersListView.as_view(), name="followed"),
     path("users/followers", FollowersListView.as_view(), name="followers"),
+    path("users/suggestions", FollowSuggestionListView.as_view(), name="suggestions"),
     path("follows/", FollowRelationshipCreateView.as_view(), name="follows"),
+    path("follows/bulk/", BulkFollowView.as_view(), name="follows-bulk"),
+    path("unfollow/bulk/", BulkUnfollowView.as_view(), name="unfollow-bulk"),
     path(
         "unfollow/<int:followed_user_pk>/",
         FollowRelationshipDestroyView.as_view(),
         name="unfollow",
     ),
+    path("metrics/", metrics, name="metrics"),
     path("auth/", include("djoser.urls")),
     path("auth/", include("djoser.urls.authtoken")),
     path("schema/", SpectacularAPIView.as_view(), name="schema"),
@@ -46,3 +69,6 @@ urlpatterns = [
         name="swagger-ui",
     ),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = async_read_urlpatterns + urlpatterns
@@ -1,4 +1,12 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    StreamingHttpResponse,
+)
+from django.utils.crypto import constant_time_compare
 from rest_framework import viewsets, permissions, response, status, filters
 from rest_framework.generics import (
     ListAPIView,
@@ -6,59 +14,159 @@ from rest_framework.generics import (
     DestroyAPIView,
     UpdateAPIView,
     ListCreateAPIView,
+    RetrieveAPIView,
+    GenericAPIView,
 )
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from .models import Card, User, FollowRelationship, CardStyleDeclaration
 from .serializers import (
     CardSerializer,
     FollowerUserSerializer,
     FollowRelationshipSerializer,
     CardStyleDeclarationSerializer,
+    UserProfileSerializer,
+    FollowSuggestionSerializer,
+    BulkFollowSerializer,
 )
 from .permissions import IsCreatorOrReadOnly
-
-
-class CardViewSet(viewsets.ModelViewSet):
+from .pagination import CardCursorPagination
+from .streaming import stream_json_list
+from .search import CardSearchFilter
+from .feed import feed_queryset
+from .caching import CachedCardReadMixin
+from .follows import follow_users, unfollow_users
+from .conditional import ConditionalCardReadMixin
+from .fastpath import FastCardReadMixin, fast_card_reads
+from .sparse import SparseFieldsMixin
+from .styles import batched_style_changes, with_styles
+from .suggestions import suggestions_for
+from .metrics import PROMETHEUS_CONTENT_TYPE, registry
+
+
+class CardViewSet(
+    CachedCardReadMixin,
+    ConditionalCardReadMixin,
+    FastCardReadMixin,
+    SparseFieldsMixin,
+    viewsets.ModelViewSet,
+):
     """
     Handle retrieve, create, edit, and destroy for cards.
-    Allow full-text search on title, body, and tags via ?search=term.
+    Allow ranked full-text search on front text, back text, and creator
+    username via ?search=term.
+    Opt into cursor pagination with ?pagination=cursor; follow the `next`
+    and `previous` links from there.
+    Anonymous list and detail reads are served from the cache.
+    List and detail send an ETag (detail also Last-Modified) and answer
+    conditional requests with 304 Not Modified.
+    Reads can be trimmed with ?fields=id,front_text or ?omit=styles.
     """
 
-    queryset = Card.objects.all().order_by("-created_at")
+    queryset = Card.objects.select_related("creator").order_by("-created_at", "-id")
     serializer_class = CardSerializer
     permission_classes = [IsCreatorOrReadOnly]
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [CardSearchFilter]
     search_fields = ["front_text", "back_text", "creator__username"]
 
     def perform_create(self, serializer):
         serializer.save(creator=self.request.user)
 
     def get_queryset(self):
-        return self.queryset.filter(draft=False)
+        return self.sparse_queryset(with_styles(self.queryset.filter(draft=False)))
 
     def get_permissions(self):
         if self.request.method in permissions.SAFE_METHODS:
             return [permissions.AllowAny()]
         return super().get_permissions()
 
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            params = self.request.query_params if self.request else {}
+            if params.get("pagination") == "cursor" or "cursor" in params:
+                self._paginator = CardCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     @action(detail=False)
     def me(self, request):
+        """
+        List the logged in user's cards, drafts included. Filter with
+        ?draft=true|false and ?search=term. Pass ?stream=true to get every
+        matching card as one unpaginated JSON array streamed in chunks.
+        """
         if not request.user.is_authenticated:
             return response.Response(
                 {"error": "You need to be logged in."},
                 status=status.HTTP_401_UNAUTHORIZED,
             )
-        cards = self.queryset.filter(creator=request.user)
-        return response.Response(self.serializer_class(cards, many=True).data)
+        cards = self.filter_queryset(
+            self.sparse_queryset(
+                with_styles(self.queryset.filter(creator=request.user))
+            )
+        )
+        draft = request.query_params.get("draft")
+        if draft is not None:
+            cards = cards.filter(draft=draft.lower() in ("true", "1"))
+
+        if request.query_params.get("stream", "").lower() in ("true", "1"):
+            return StreamingHttpResponse(
+                stream_json_list(
+                    cards,
+                    self.serializer_class,
+                    self.get_serializer_context(),
+                    fields=self.sparse_fields,
+                ),
+                content_type="application/json",
+            )
+
+        if fast_card_reads():
+            return self.card_list_response(cards)
+        page = self.paginate_queryset(cards)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class FeedView(FastCardReadMixin, SparseFieldsMixin, ListAPIView):
+    """
+    Handles /feed/
+
+    Returns published cards from users the current user follows, newest first.
+    Cards from users who have blocked the current user are left out.
+    Uses cursor pagination; follow the `next` link for older cards.
+    Trim cards with ?fields= or ?omit= as on /cards/.
+    """
+
+    serializer_class = CardSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CardCursorPagination
+
+    def get_queryset(self):
+        return self.sparse_queryset(
+            with_styles(feed_queryset(self.request.user).select_related("creator"))
+        )
+
+
+class UserProfileView(RetrieveAPIView):
+    """
+    Handles /users/<pk>/
+
+    Returns a user's username with their follower, following and published card counts.
+    """
+
+    queryset = User.objects.all()
+    serializer_class = UserProfileSerializer
+    permission_classes = [permissions.IsAuthenticated]
 
 
 class FollowedUsersListView(ListAPIView):
     """
     Handles /users/followed
 
-    Returns a list of users who the current user follows (excluding blocked follows)
+    Returns a list of users who the current user follows (excluding blocked follows), most recently followed first
     """
 
     queryset = User.objects.all()
@@ -66,16 +174,15 @@ class FollowedUsersListView(ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return self.request.user.followed_users.filter(
-            relationship_as_followed_user__status=FollowRelationship.Status.ACTIVE
-        )
+        user = self.request.user
+        return User.objects.followed_by_user(user).with_follow_flags(user)
 
 
 class FollowersListView(ListAPIView):
     """
     Handles /users/followers
 
-    Returns a list of users who follow the current user (excluding blocked users)
+    Returns a list of users who follow the current user (excluding blocked users), most recent followers first
     """
 
     queryset = User.objects.all()
@@ -83,9 +190,23 @@ class FollowersListView(ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return self.request.user.followed_by.filter(
-            relationship_as_follower__status=FollowRelationship.Status.ACTIVE
-        )
+        user = self.request.user
+        return User.objects.following_user(user).with_follow_flags(user)
+
+
+class FollowSuggestionListView(ListAPIView):
+    """
+    Handles /users/suggestions
+
+    Returns users the current user may know, ranked by how many of the people they follow also follow them ("score").
+    Suggestions are precomputed by the refresh_suggestions command; users followed or blocked since are left out.
+    """
+
+    serializer_class = FollowSuggestionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return suggestions_for(self.request.user)
 
 
 class FollowRelationshipCreateView(CreateAPIView):
@@ -99,12 +220,46 @@ class FollowRelationshipCreateView(CreateAPIView):
 
     def perform_create(self, serializer):
         try:
-            serializer.save(follower=self.request.user)
-        except IntegrityError as e:
-            if "unique constraint" in str(e):
-                raise ValidationError("You already follow this user.")
-            raise e
-        return super().perform_create(serializer)
+            # keep the follow and its counter updates in one transaction
+            with transaction.atomic():
+                serializer.save(follower=self.request.user)
+        except IntegrityError:
+            # followed_user is already validated to exist, so the only
+            # constraint left to violate is unique_follows
+            raise ValidationError("You already follow this user.")
+
+
+class BulkFollowView(GenericAPIView):
+    """
+    Follow every user in the request body's "user_ids" list (up to 100) in one transaction.
+    Responds with the outcome for each id: "followed", "already_following", "not_found" or "cannot_follow_self".
+    """
+
+    serializer_class = BulkFollowSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    bulk_action = staticmethod(follow_users)
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        outcomes = self.bulk_action(request.user, serializer.validated_data["user_ids"])
+        return response.Response(
+            {
+                "results": [
+                    {"user_id": user_id, "result": outcome}
+                    for user_id, outcome in outcomes.items()
+                ]
+            }
+        )
+
+
+class BulkUnfollowView(BulkFollowView):
+    """
+    Unfollow every user in the request body's "user_ids" list (up to 100) in one transaction.
+    Responds with the outcome for each id: "unfollowed" or "not_following".
+    """
+
+    bulk_action = staticmethod(unfollow_users)
 
 
 class FollowRelationshipDestroyView(DestroyAPIView):
@@ -125,17 +280,34 @@ class FollowRelationshipDestroyView(DestroyAPIView):
         )
 
 
-class CardStyleDeclarationListCreateView(ListCreateAPIView):
+class BatchedStyleChangesMixin:
+    """Sync the styles a request changes once, when it's done (see api.styles)."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with batched_style_changes():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class CardStyleDeclarationListCreateView(
+    BatchedStyleChangesMixin, ConditionalCardReadMixin, ListCreateAPIView
+):
     """
     Get or create a style declaration for a card. The card must belong to the logged in user in order to save styles for it.
     Properties and values are not validated to be valid CSS properties or values. If a property already exists, it will be ignored.
     To update properties, use the PATCH method.
+    Listing sends ETag and Last-Modified taken from the card and answers conditional requests with 304 Not Modified.
     """
 
     queryset = CardStyleDeclaration.objects.all()
     serializer_class = CardStyleDeclarationSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def get_queryset(self):
+        return self.queryset.filter(card_id=self.kwargs["card_pk"]).order_by("pk")
+
+    def get_validator_queryset(self):
+        return Card.objects.filter(pk=self.kwargs["card_pk"])
+
     def perform_create(self, serializer):
         card = Card.objects.get(pk=self.kwargs["card_pk"])
         if card.creator != self.request.user:
@@ -150,10 +322,11 @@ class CardStyleDeclarationListCreateView(ListCreateAPIView):
         return super().get_serializer(*args, **kwargs)
 
 
-class CardStyleDeclarationUpdateView(UpdateAPIView):
+class CardStyleDeclarationUpdateView(BatchedStyleChangesMixin, UpdateAPIView):
     """
-    Update a style declaration for a card. The card must belong to the logged in user in order to save styles for it.
+    Update style declarations for a card. The card must belong to the logged in user in order to save styles for it.
     Properties and values are not validated to be valid CSS properties or values.
+    Properties the card doesn't have yet are created. Each object sets either "value" or "boolValue", not both.
     The body of the request should be an array of objects with the following shape:
     [
         {
@@ -173,15 +346,20 @@ class CardStyleDeclarationUpdateView(UpdateAPIView):
             self.request.user.cards.all(), pk=self.kwargs["card_pk"]
         )
 
-    def perform_update(self, serializer):
-        card = Card.objects.get(pk=self.kwargs["card_pk"])
-        if card.creator != self.request.user:
-            raise ValidationError(
-                "You must be the author of the card to save styles for it."
-            )
-        if not isinstance(serializer.validated_data, list):
-            serializer.validated_data = [serializer.validated_data]
-        serializer.save(card=card)
-
     def get_serializer(self, *args, **kwargs):
         return super().get_serializer(*args, many=True, **kwargs)
+
+
+def metrics(request):
+    """
+    Handles /metrics/
+
+    Per-view request counts, latency, query and render totals in Prometheus text format (see api/metrics.py).
+    Requires an "Authorization: Bearer <METRICS_TOKEN>" header; returns 404 unless METRICS_TOKEN is set.
+    """
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    expected = f"Bearer {settings.METRICS_TOKEN}"
+    if not constant_time_compare(request.headers.get("Authorization", ""), expected):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,36 @@
+"""
+Sentry trace sampling by endpoint.
+"""
+
+from django.urls import Resolver404, resolve
+
+
+def traces_sampler(default_rate, rates):
+    """
+    Build a Sentry traces_sampler that samples requests to the URL names in
+    `rates` (e.g. {"cards-list": 0.01}) at their own rate, and everything
+    else at `default_rate`. Traces continued from an upstream service keep
+    the upstream sampling decision.
+    """
+
+    def sampler(sampling_context):
+        if sampling_context.get("parent_sampled") is not None:
+            return sampling_context["parent_sampled"]
+        path = request_path(sampling_context)
+        if path is None:
+            return default_rate
+        try:
+            name = resolve(path).view_name
+        except Resolver404:
+            return default_rate
+        return rates.get(name, default_rate)
+
+    return sampler
+
+
+def request_path(sampling_context):
+    if "wsgi_environ" in sampling_context:
+        return sampling_context["wsgi_environ"].get("PATH_INFO")
+    if "asgi_scope" in sampling_context:
+        return sampling_context["asgi_scope"].get("path")
+    return None
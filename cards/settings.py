@@ -11,9 +11,12 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
 from pathlib import Path
+import django
 import environ
 import sentry_sdk
 from sentry_sdk.integrations.django import DjangoIntegration
+from django.core.exceptions import ImproperlyConfigured
+from cards.sentry import traces_sampler
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -55,6 +58,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.metrics.RequestMetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
@@ -94,6 +98,60 @@ DATABASES = {
     "default": env.db(),
 }
 
+# Keep connections open between requests for DB_CONN_MAX_AGE seconds instead
+# of reconnecting (TLS + auth) every time, checking them before reuse.
+# gunicorn.conf.py sets it to 0 under ASGI, where connections aren't reused
+# across requests; use DB_POOL there instead.
+DATABASES["default"]["CONN_MAX_AGE"] = env.int("DB_CONN_MAX_AGE", default=60)
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = env.bool(
+    "DB_CONN_HEALTH_CHECKS", default=True
+)
+
+# Optional psycopg 3 connection pool. Needs Django 5.1+, PostgreSQL and
+# psycopg[pool] installed; pooled connections are returned after each
+# request, so persistent connections are turned off.
+if env.bool("DB_POOL", default=False):
+    if django.VERSION < (5, 1):
+        raise ImproperlyConfigured("DB_POOL needs Django 5.1 or later.")
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+        "min_size": env.int("DB_POOL_MIN_SIZE", default=2),
+        "max_size": env.int("DB_POOL_MAX_SIZE", default=10),
+        "timeout": env.int("DB_POOL_TIMEOUT", default=10),
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+}
+
+# Whether every worker process sees the same cache. The caches below hold
+# entries that writes invalidate, so they are off by default with a
+# per-process cache such as the default locmem one
+SHARED_CACHE = not CACHES["default"]["BACKEND"].endswith(
+    ("LocMemCache", "DummyCache")
+)
+
+# Seconds to cache anonymous card list/detail responses; 0 turns it off
+CARD_CACHE_TIMEOUT = env.int("CARD_CACHE_TIMEOUT", default=300 if SHARED_CACHE else 0)
+
+# Serialize card list/detail GETs from .values() rows (see api/fastpath.py)
+# instead of through CardSerializer
+CARD_FAST_SERIALIZATION = env.bool("CARD_FAST_SERIALIZATION", default=True)
+
+# Where card reads get styles from: "rows" (CardStyleDeclaration) or
+# "compact" (the Card.compact_styles copy, no extra query; see api/styles.py)
+CARD_STYLE_STORAGE = env("CARD_STYLE_STORAGE", default="rows")
+
+
+# Seconds to cache auth token lookups; 0 turns it off
+AUTH_TOKEN_CACHE_TIMEOUT = env.int(
+    "AUTH_TOKEN_CACHE_TIMEOUT", default=300 if SHARED_CACHE else 0
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -139,13 +197,27 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Covering index columns (Index.include) only apply on Postgres; SQLite
+# builds the same indexes without them, which is fine for local development.
+SILENCED_SYSTEM_CHECKS = ["models.W040"]
 AUTH_USER_MODEL = "api.User"
 
 
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticated"],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication"
+        "api.authentication.CachedTokenAuthentication"
+    ],
+    # orjson-backed, with the same output as DRF's JSON renderer and parser
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "api.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
@@ -161,6 +233,21 @@ SPECTACULAR_SETTINGS = {
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Home feed: "read" builds feeds with a join at request time, "hybrid" also
+# fans new cards out to followers' FeedEntry rows (see api/feed.py).
+FEED_MODE = env("FEED_MODE", default="read")
+FEED_FANOUT_MAX_FOLLOWERS = env.int("FEED_FANOUT_MAX_FOLLOWERS", default=10000)
+FEED_BACKFILL_LIMIT = env.int("FEED_BACKFILL_LIMIT", default=100)
+
+# Serve card list/detail, the feed and followers from the async views in
+# api/async_views.py. Turn on when running under ASGI (see gunicorn.conf.py).
+ASYNC_READ_VIEWS = env.bool("ASYNC_READ_VIEWS", default=False)
+
+# Per-request metrics (see api/metrics.py): send Server-Timing headers, and
+# serve /api/metrics/ to requests bearing METRICS_TOKEN (off when unset).
+SERVER_TIMING = env.bool("SERVER_TIMING", default=True)
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+
 if env("USE_SENTRY"):
     sentry_sdk.init(
         dsn=env("SENTRY_DSN"),
@@ -168,12 +255,12 @@ if env("USE_SENTRY"):
         # If you wish to associate users to errors (assuming you are using
         # django.contrib.auth) you may enable sending PII data.
         send_default_pii=True,
-        # Set traces_sample_rate to 1.0 to capture 100%
-        # of transactions for performance monitoring.
-        # We recommend adjusting this value in production.
-        traces_sample_rate=1.0,
-        # Set profiles_sample_rate to 1.0 to profile 100%
-        # of sampled transactions.
-        # We recommend adjusting this value in production.
-        profiles_sample_rate=1.0,
+        # Sample SENTRY_TRACES_SAMPLE_RATE of transactions, overridden per URL
+        # name with e.g. SENTRY_TRACES_SAMPLE_RATES="cards-list=0.01,feed=0.2".
+        traces_sampler=traces_sampler(
+            env.float("SENTRY_TRACES_SAMPLE_RATE", default=0.1),
+            env.dict("SENTRY_TRACES_SAMPLE_RATES", cast={"value": float}, default={}),
+        ),
+        # Share of sampled transactions that are also profiled.
+        profiles_sample_rate=env.float("SENTRY_PROFILES_SAMPLE_RATE", default=0.1),
     )
@@ -0,0 +1,15 @@
+# Serves cards.wsgi with sync workers by default. Set ASGI_SERVER=true to
+# serve cards.asgi with uvicorn workers instead, together with
+# ASYNC_READ_VIEWS=true so the hot read endpoints run as async views.
+import os
+
+bind = ":8000"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+
+if os.environ.get("ASGI_SERVER", "").lower() in ("true", "1"):
+    wsgi_app = "cards.asgi:application"
+    # persistent connections aren't reused across requests under ASGI
+    os.environ.setdefault("DB_CONN_MAX_AGE", "0")
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "cards.wsgi"